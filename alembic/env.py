@@ -15,13 +15,19 @@ config = context.config
 if config.config_file_name is not None:
     fileConfig(config.config_file_name)
 
-# ▼▼▼▼▼ ここにモデルのメタデータを追加 ▼▼▼▼▼
-# autogenerate 機能を使うためには、ここに SQLAlchemy の metadata を指定する必要がある
-# 例:
-# from yourapp.models import Base
-# target_metadata = Base.metadata
+# ▼▼▼▼▼ モデルのメタデータ ▼▼▼▼▼
+# autogenerate 機能のため、core のモデルの metadata を指定する。
+# 接続先はアプリと同じ（.env の DATABASE_URL。相対パスの SQLite は instance/ 配下）
+from core import create_app
+from core.models import db
+
+_app = create_app("app")
+with _app.app_context():
+    config.set_main_option(
+        "sqlalchemy.url", db.engine.url.render_as_string(hide_password=False).replace("%", "%%")
+    )
 
-target_metadata = None  # 初期状態では None。使いたい場合は上で読み込んで代入。
+target_metadata = db.metadata
 
 # その他、alembic.ini に定義した独自の設定値を取得したい場合
 # my_option = config.get_main_option("my_important_option")
@@ -0,0 +1,41 @@
+"""widen user.password_hash for scrypt hashes
+
+Revision ID: 3f9c2a7d1b4e
+Revises: 
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f9c2a7d1b4e'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # scrypt:32768:8:1 のハッシュは約160文字になり String(150) に入らない
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.alter_column(
+            "password_hash",
+            existing_type=sa.String(length=150),
+            type_=sa.String(length=255),
+            existing_nullable=False,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.batch_alter_table("user") as batch_op:
+        batch_op.alter_column(
+            "password_hash",
+            existing_type=sa.String(length=255),
+            type_=sa.String(length=150),
+            existing_nullable=False,
+        )
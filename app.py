@@ -1,127 +1,63 @@
 import requests
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_sqlalchemy import SQLAlchemy
-from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import render_template, request, redirect, url_for, flash, jsonify
+from flask_login import LoginManager, login_user, login_required, logout_user, current_user
 import re
-from datetime import datetime, date
-from collections import defaultdict
-from flask_login import login_required, current_user
-
-# Dotenvの読み込み（必要に応じて）
-import os
-from dotenv import load_dotenv
-load_dotenv()
-
-# Flaskアプリ設定
-app = Flask(__name__)
-app.secret_key = 'your_secret_key'  # 必ずあなたの秘密鍵を設定してください
-
-GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "")
-GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
-TMDB_API_KEY  = os.getenv("TMDB_API_KEY", "")
-
-# DB設定
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///app.db'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db = SQLAlchemy(app)
+from datetime import datetime, timedelta
+
+from core import create_app, assets, logsearch, logstore, passwords, recommend, upstream
+from core.models import DailyActivity, Log, User, db, init_db, insert_log
+
+# Flaskアプリ設定（秘密鍵・DBは .env の SECRET_KEY / DATABASE_URL）
+app = create_app(__name__)
+# flask build-assets 済みなら static はハッシュ付きURL + immutable で配信
+assets.init_app(app)
 
 # Flask-Login設定
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
-# Userモデル
-
-
-class User(UserMixin, db.Model):
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(150), nullable=False)
-    email = db.Column(db.String(150), unique=True, nullable=False)
-    password_hash = db.Column(db.String(150), nullable=False)
-    mbti_type = db.Column(db.String(4), nullable=True)
-    city = db.Column(db.String(50), nullable=True)
-
-    def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
-
-# Logモデル
-
-
-class Log(db.Model):
-    __tablename__ = 'logs'
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    message = db.Column(db.Text, nullable=False)
-    role = db.Column(db.String(20), nullable=False)
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    user = db.relationship('User', backref='logs')
-
-
-# DB初期化
-with app.app_context():
-    db.create_all()
-
 # ユーザーロード用
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
-
-# ログ保存
-
+    return db.session.get(User, int(user_id))
 
-def insert_log(user_id, message, role):
-    log = Log(user_id=user_id, message=message, role=role)
-    db.session.add(log)
-    db.session.commit()
-
-# ログ取得
 
+CITY_NAME_MAP = {
+    "Tokyo": "東京", "Osaka": "大阪", "Sapporo": "札幌", "Fukuoka": "福岡",
+    "Nagoya": "名古屋", "Kanagawa": "神奈川", "Yokohama": "横浜", "Kyoto": "京都", "Kobe": "神戸"
+}
 
-def get_logs(user_id):
-    return Log.query.filter_by(user_id=user_id).order_by(Log.timestamp.desc()).all()
+# ブラウザが /weather を再取得せずに使う秒数（以降は ETag で再検証）
+WEATHER_BROWSER_MAX_AGE = 60
 
 
 @app.route('/')
 def index():
     if current_user.is_authenticated:
         city = current_user.city or "Tokyo"
-        weather, temp = get_weather(city, OPENWEATHER_API_KEY)
-
-        CITY_NAME_MAP = {
-            "Tokyo": "東京", "Osaka": "大阪", "Sapporo": "札幌", "Fukuoka": "福岡",
-            "Nagoya": "名古屋", "Kanagawa": "神奈川", "Yokohama": "横浜", "Kyoto": "京都", "Kobe": "神戸"
-        }
+        # 天気APIは待たず、取得済みの天気だけで描画する（無い・古いときは script.js が /weather で更新）
+        weather, temp, fresh = recommend.cached_weather(city)
         city_ja = CITY_NAME_MAP.get(city, city)
-        return render_template('index.html', weather=weather, temp=temp, city=city_ja)
+        return render_template('index.html', weather=weather, temp=temp, city=city_ja,
+                               weather_fresh=fresh)
     else:
         return redirect(url_for('register'))
 
 
-def get_weather(city_name, api_key):
-    # APIキーが設定されていない場合はNoneを返す
-    if not api_key or api_key == "YOUR_OPENWEATHER_API_KEY":
-        return None, None
-    url = f"http://api.openweathermap.org/data/2.5/weather?q={city_name}&appid={api_key}&lang=ja&units=metric"
-    try:
-        res = requests.get(url)
-        # HTTPステータスコードが200以外の場合も例外を発生させる
-        res.raise_for_status()
-        data = res.json()
-        return data['weather'][0]['description'], data['main']['temp']
-    except requests.exceptions.RequestException as e:
-        print(f"OpenWeather APIとの通信エラー: {e}")
-    except Exception as e:
-        print(f"OpenWeather API処理中の予期せぬエラー: {e}")
-    return None, None
+@app.route('/weather')
+@login_required
+def weather_info():
+    city = current_user.city or "Tokyo"
+    weather, temp = recommend.get_weather(city)
+    res = jsonify({'city': CITY_NAME_MAP.get(city, city), 'weather': weather, 'temp': temp})
+    # 天気が変わらなければ 304 を返す
+    res.add_etag()
+    res.cache_control.private = True
+    res.cache_control.max_age = WEATHER_BROWSER_MAX_AGE
+    return res.make_conditional(request)
 
 
 @app.route('/ai', methods=['POST'])
@@ -138,31 +74,24 @@ def ai():
 
     mbti = current_user.mbti_type
     city = current_user.city or "Tokyo"
-    weather, temp = get_weather(city, OPENWEATHER_API_KEY)
-
-    mbti_text = f" ユーザーのMBTIタイプは {mbti} です。MBTIの性格傾向も考慮して、" if mbti and mbti.lower(
-    ) != 'わからない' else ""
-    weather_text = f" 現在の天気は「{weather}」、気温は{temp}℃です。天気や気温も考慮して、" if weather and temp else ""
+    weather, temp = recommend.get_weather(city)
 
-    prompts = {
-        'playlist': f"{mbti_text}{weather_text}今の気分は「{mood}」です。この気分にぴったりの日本の曲を10曲、1行ずつ「🎵 曲名 - 理由」の形式で出力してください。",
-        'movie': f"{mbti_text}{weather_text}今の気分は「{mood}」です。この気分に合う名作の海外と日本の映画を5つ、1行ずつ「🎬 映画名 - 理由」の形式で出力してください。",
-        'food': f"""{mbti_text}{weather_text}今の気分は「{mood}」です。この気分に合った食の選択肢を、料理・外食・コンビニ商品の中から5つ提案してください。それぞれ「🍽️ 食事名 - 理由 - 主な栄養素（例：たんぱく質、炭水化物、ビタミンC）」の形式で出力してください。料理が向かない気分のときは、外食やコンビニを優先して構いません。""",
-        'normal': f"{mbti_text}{weather_text}今の気分は「{mood}」です。これに合う日本の曲を3つ、1行ずつ「🎵 曲名 - 理由」の形式で出力してください。次に、その気分にあう日本の映画を3つ、1行ずつ「🎬 映画名 - 理由」の形式で出力してください。最後に、今の気分にあう食事を3つ、1行ずつ「🍽️ 食事名 - 理由」の形式で出力してください。"
-    }
-    prompt = prompts.get(mode, prompts['normal'])
+    prompt = recommend.build_prompt(mbti, weather, temp, mood, mode)
 
-    GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL_NAME}:generateContent?key={GEMINI_API_KEY}"
-    headers = {"Content-Type": "application/json"}
-    data = {"contents": [{"parts": [{"text": prompt}]}]}
-
-    insert_log(current_user.id, mood, "user")
+    insert_log(current_user.id, mood, "user", mode)
 
     try:
-        response = requests.post(GEMINI_URL, headers=headers, json=data)
-        response.raise_for_status()  # HTTPエラーがあれば例外を発生させる
-        result = response.json()
-        raw_text = result['candidates'][0]['content']['parts'][0]['text']
+        result = recommend.generate_recommendation(prompt, mode, user_id=current_user.id)
+    except upstream.QuotaExceeded as e:
+        print(f"Gemini APIの予算不足: {e}")
+        error_message = "混雑のため現在AIを利用できません。しばらくしてから再度お試しください。"
+        insert_log(current_user.id, error_message, "assistant")
+        return jsonify({'reply': error_message, 'movies': []}), 429
+    except upstream.CircuitOpen as e:
+        print(f"Gemini APIが障害中: {e}")
+        error_message = "AIが一時的に利用できません。しばらくしてから再度お試しください。"
+        insert_log(current_user.id, error_message, "assistant")
+        return jsonify({'reply': error_message, 'movies': []}), 503
     except (requests.exceptions.RequestException, KeyError, IndexError) as e:
         print(f"Gemini APIとの通信エラーまたはデータ解析エラー: {e}")
         error_message = f"AIとの通信中にエラーが発生しました: {e}"
@@ -174,19 +103,9 @@ def ai():
         insert_log(current_user.id, error_message, "assistant")
         return jsonify({'reply': error_message, 'movies': []}), 500
 
-    enriched_text = raw_text
-
-    # YouTubeリンクの処理
-    song_lines = re.findall(r'🎵 (.+?) -', raw_text)
-    for song in song_lines:
-        url = search_youtube_first_video(song)
-        # re.escape()で特殊文字をエスケープして正規表現の誤作動を防ぐ
-        enriched_text = re.sub(rf"(🎵\s*){re.escape(song)}(\s*-)",
-                               rf"\1<a href='{url}' target='_blank' class='text-blue-400 underline'>{song}</a>\2", enriched_text, count=1)
-
     # 「近くのお店を探す」ボタンの追加 (アイコン付き、修正版)
-    food_lines = re.findall(r'🍽️\s*(.+?)\s*-', enriched_text)
-    for food in food_lines:
+    enriched_text = result['reply']
+    for food in (f['name'] for f in result['foods']):
         food_id = re.sub(r'\s+', '_', food)
         button_html = f"""
         <button onclick="findNearbyRestaurants('{food}')" class='text-sm bg-white-600 hover:bg-white-700 text-white font-bold py-2 px-3 rounded-lg ml-2 shadow-md transform hover:-translate-y-px transition-all duration-300'>
@@ -197,42 +116,10 @@ def ai():
         enriched_text = re.sub(
             rf"(🍽️\s*{re.escape(food)}\s*-.*)", rf"\1 {button_html}", enriched_text, count=1)
 
-    # 映画情報の処理
-    def extract_movie_titles(text):
-        pattern = r"🎬\s*(.+?)\s*-\s*.+"
-        return re.findall(pattern, text)
-
-    def search_movie_tmdb(title):
-        # The Movie DBのAPIキー（必要ならこれも先頭に設定してください）
-        url = "https://api.themoviedb.org/3/search/movie"
-        params = {"api_key": TMDB_API_KEY, "query": title, "language": "ja-JP"}
-        try:
-            res = requests.get(url, params=params)
-            res.raise_for_status()  # HTTPエラーがあれば例外を発生させる
-            data = res.json()
-            if data["results"]:
-                movie = data["results"][0]
-                return {
-                    "title": movie.get("title"),
-                    "overview": movie.get("overview"),
-                    "release_date": movie.get("release_date"),
-                    "poster_path": f"https://image.tmdb.org/t/p/w300{movie.get('poster_path')}" if movie.get("poster_path") else None,
-                    "tmdb_url": f"https://www.themoviedb.org/movie/{movie.get('id')}"
-                }
-        except requests.exceptions.RequestException as e:
-            print(f"TMDB APIとの通信エラー: {e}")
-        except Exception as e:
-            print(f"TMDB API処理中の予期せぬエラー: {e}")
-        return None
-
-    movie_titles = extract_movie_titles(raw_text)
-    movie_infos = [info for title in movie_titles if (
-        info := search_movie_tmdb(title))]
-
-    insert_log(current_user.id, raw_text, "assistant")
+    insert_log(current_user.id, result['raw_text'], "assistant")
 
     # movieモードかnormalモードの場合のみ映画情報を返す
-    return jsonify({'reply': enriched_text, 'movies': movie_infos if mode in ['movie', 'normal'] else []})
+    return jsonify({'reply': enriched_text, 'movies': result['movies']})
 
 
 @app.route('/find_restaurants')
@@ -246,38 +133,15 @@ def find_restaurants():
         return jsonify({"error": "緯度、経度、食事が指定されていません。"}), 400
 
     # Google Maps Platform APIキーが設定されていない場合はエラーを返す
-    if not GOOGLE_MAPS_API_KEY or GOOGLE_MAPS_API_KEY.strip() == "YOUR_GOOGLE_MAPS_API_KEY":
+    if not recommend.maps_configured():
         return jsonify({"error": "Google Maps APIキーが設定されていません。adminにご連絡ください。"}), 500
 
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
-        "location": f"{lat},{lon}",
-        "radius": 1500,  # 検索半径(メートル)
-        "keyword": food,
-        "language": "ja",
-        "key": GOOGLE_MAPS_API_KEY.strip()  # APIキーの末尾の空白を除去
-    }
     try:
-        res = requests.get(url, params=params)
-        res.raise_for_status()  # HTTPステータスコードが200以外の場合も例外を発生させる
-        data = res.json()
-
-        results = []
-        for place in data.get("results", []):
-            # GoogleマップのURLを構築。店名をURLエンコードする
-            map_url = f"https://www.google.com/maps/search/?api=1&query={requests.utils.quote(place.get('name', ''))}&query_place_id={place.get('place_id', '')}"
-
-            results.append({
-                "name": place.get("name"),
-                "vicinity": place.get("vicinity"),  # 住所
-                "rating": place.get("rating", "N/A"),
-                "url": map_url
-            })
-        return jsonify(results)
+        return jsonify(recommend.search_restaurants(lat, lon, food))
     except requests.exceptions.RequestException as e:
         print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
         print("/find_restaurants でHTTPエラーが発生しました:")
-        print(f"URL: {url}, Params: {params}")
+        print(f"lat: {lat}, lon: {lon}, food: {food}")
         print(f"エラー内容: {e}")
         print("!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!")
         return jsonify({"error": f"レストラン検索APIとの通信に失敗しました。詳細: {e}"}), 500
@@ -289,86 +153,48 @@ def find_restaurants():
         return jsonify({"error": f"レストラン検索中に予期せぬエラーが発生しました。"}), 500
 
 
-def search_youtube_first_video(query):
-    # APIキーが設定されていない場合はデフォルトのURLを返す
-    if not YOUTUBE_API_KEY or YOUTUBE_API_KEY == "YOUR_YOUTUBE_API_KEY":
-        return "#"
-
-    url = 'https://www.googleapis.com/youtube/v3/search'
-    params = {
-        'part': 'snippet',
-        'q': f'{query} MV',
-        'type': 'video',
-        'maxResults': 5,
-        'key': YOUTUBE_API_KEY,
-        'regionCode': 'JP',
-        'relevanceLanguage': 'ja',
-        'order': 'relevance'
-    }
-    try:
-        res = requests.get(url, params=params)
-        res.raise_for_status()
-        data = res.json()
-        for item in data.get("items", []):
-            if 'videoId' in item['id']:
-                return f"https://www.youtube.com/watch?v={item['id']['videoId']}"
-    except requests.exceptions.RequestException as e:
-        print(f"YouTube検索エラー: {e}")
-    except Exception as e:
-        print(f"YouTube検索処理中の予期せぬエラー: {e}")
-    return "#"
-
-
-def search_movie_tmdb(title):
-    # TMDB APIキーが設定されていない場合はNoneを返す
-    if not TMDB_API_KEY:
-        return None
-
-    url = "https://api.themoviedb.org/3/search/movie"
-    params = {
-        "api_key": TMDB_API_KEY,
-        "query": title,
-        "language": "ja-JP"
-    }
-    try:
-        res = requests.get(url, params=params)
-        res.raise_for_status()
-        data = res.json()
-        if data["results"]:
-            movie = data["results"][0]
-            return {
-                "title": movie.get("title"),
-                "overview": movie.get("overview"),
-                "release_date": movie.get("release_date"),
-                "poster_path": f"https://image.tmdb.org/t/p/w300{movie.get('poster_path')}" if movie.get("poster_path") else None,
-                "tmdb_url": f"https://www.themoviedb.org/movie/{movie.get('id')}"
-            }
-    except requests.exceptions.RequestException as e:
-        print(f"TMDB検索エラー: {e}")
-    except Exception as e:
-        print(f"TMDB検索処理中の予期せぬエラー: {e}")
-    return None
-
-
 @app.route('/logs')
 @login_required
 def show_logs():
+    # キーワード検索（全文検索インデックスを使用）
+    keyword = request.args.get('q', '').strip()
+    if keyword:
+        page = request.args.get('page', 1, type=int)
+        results, has_next = logsearch.search(db.session, current_user.id, keyword, page=page)
+        return render_template('logs.html', days=[], keyword=keyword, results=results,
+                               page=page, has_next=has_next, selected_date=None)
+
+    # 日付の一覧は集計テーブルから作り、各日のログは開いたときに /logs/day/<日付> で読み込む
     selected_date = request.args.get('date')
-    logs_query = Log.query.filter_by(user_id=current_user.id)
+    days_query = DailyActivity.query.filter_by(user_id=current_user.id)
     if selected_date:
         try:
             date_obj = datetime.strptime(selected_date, '%Y-%m-%d').date()
-            logs_query = logs_query.filter(
-                db.func.date(Log.timestamp) == date_obj)
+            days_query = days_query.filter(DailyActivity.day == date_obj)
         except ValueError:
             flash("日付形式が不正です", "error")
 
-    logs = logs_query.order_by(Log.timestamp.desc()).all()
-    grouped_logs = defaultdict(list)
-    for log in logs:
-        grouped_logs[log.timestamp.strftime('%Y-%m-%d')].append(log)
+    # 集計テーブル導入前のログがあるユーザーは、ここで一度だけその分の集計を作る
+    logstore.backfill_activity(db.session, current_user.id)
+    days = days_query.order_by(DailyActivity.day.desc()).all()
+
+    return render_template('logs.html', days=days, selected_date=selected_date)
 
-    return render_template('logs.html', grouped_logs=dict(sorted(grouped_logs.items(), reverse=True)), selected_date=selected_date)
+
+@app.route('/logs/day/<day>')
+@login_required
+def show_logs_day(day):
+    try:
+        start = datetime.strptime(day, '%Y-%m-%d')
+    except ValueError:
+        return "日付形式が不正です", 400
+    logs = (Log.query
+            .filter(Log.user_id == current_user.id,
+                    Log.timestamp >= start,
+                    Log.timestamp < start + timedelta(days=1))
+            .order_by(Log.timestamp.desc())
+            .all())
+    return render_template('logs_day.html', logs=logs, safe_date=day.replace('-', '_'))
 
 
 @app.route('/logs/delete/<int:log_id>', methods=['POST'])
@@ -378,17 +204,49 @@ def delete_log(log_id):
     if log.user_id != current_user.id:
         flash("削除権限がありません。")
         return redirect(url_for('show_logs'))
+    day = log.timestamp.date()
     db.session.delete(log)
     db.session.commit()
+    logstore.refresh_days(db.session, current_user.id, [day])
     flash("ログを削除しました。")
     return redirect(url_for('show_logs'))
 
 
+@app.route('/logs/delete', methods=['POST'])
+@login_required
+def bulk_delete_logs():
+    # チェックしたログ、または指定日より前のログをまとめて削除
+    ids = request.form.getlist('log_ids', type=int)
+    before = request.form.get('before')
+    if ids:
+        deleted = logstore.bulk_delete(db.session, current_user.id, ids=ids)
+    elif before:
+        try:
+            before_dt, _ = logstore.parse_date(before)
+        except ValueError:
+            flash("日付形式が不正です", "error")
+            return redirect(url_for('show_logs'))
+        deleted = logstore.bulk_delete(
+            db.session, current_user.id, conditions=logstore.range_conditions(before=before_dt))
+    else:
+        flash("削除するログを選択してください。")
+        return redirect(url_for('show_logs'))
+    flash(f"{deleted} 件のログを削除しました。")
+    return redirect(url_for('show_logs'))
+
+
 @app.route('/mbti')
 def mbti():
     return render_template('mbti.html')
 
 
+@app.errorhandler(passwords.PasswordHashBusy)
+def password_hash_busy(e):
+    flash('ただいま混み合っています。少し待ってからもう一度お試しください。')
+    template = 'register.html' if request.endpoint == 'register' else 'login.html'
+    return render_template(template), 503, {'Retry-After': '1'}
+
+
 @app.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
@@ -417,6 +275,7 @@ def login():
         password = request.form['password']
         user = User.query.filter_by(email=email).first()
         if user and user.check_password(password):
+            db.session.commit()  # 再ハッシュした場合の保存
             login_user(user)
             return redirect(url_for('index'))
         else:
@@ -446,5 +305,8 @@ def profile():
 
 
 if __name__ == '__main__':
+    # 開発サーバーではテーブルが無ければ作る（本番は flask init-db）
+    with app.app_context():
+        init_db()
     print("🌟 Flaskサーバー起動中… http://127.0.0.1:5000/")
     app.run(debug=True)
@@ -0,0 +1,122 @@
+"""
+大きなログ一覧（/api/logs）の JSON シリアライズ時間と転送量の計測。
+
+1) 同じデータを標準の json / orjson のプロバイダで応答にする時間とサイズ
+2) 実際に /api/logs を Accept-Encoding を変えて呼び、応答時間と転送バイト数
+
+    python bench/bench_json.py --rows 20000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_json_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault("GOVERNOR_DB_PATH", os.path.join(_tmpdir, "governor.db"))
+
+import server  # noqa: E402
+from core import compression, jsonprovider  # noqa: E402
+from core.models import Log, User, db, init_db  # noqa: E402
+
+SONGS = ["Pretender", "マリーゴールド", "夜に駆ける", "Lemon", "白日", "水平線", "怪獣の花唄", "ドライフラワー"]
+MOVIES = ["君の名は。", "千と千尋の神隠し", "おくりびと", "万引き家族", "ドライブ・マイ・カー", "リンダ リンダ リンダ"]
+FOODS = ["親子丼", "味噌ラーメン", "サラダチキン", "鍋焼きうどん", "オムライス", "焼き魚定食"]
+REASONS = ["前向きになれる", "切なくも温かい", "雨の日の気分にぴったり", "疲れた日でも食べやすい",
+           "たんぱく質がとれる", "気持ちが落ち着く", "元気が出る", "ゆっくり休みたい夜に"]
+
+
+def _reply(rng):
+    """AI応答に似た、行ごとに内容の違うテキスト"""
+    lines = []
+    for emoji, items in (("🎵", SONGS), ("🎬", MOVIES), ("🍽️", FOODS)):
+        for _ in range(3):
+            video = "".join(rng.choices("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-", k=11))
+            title = rng.choice(items)
+            if emoji == "🎵":
+                title = f"<a href='https://www.youtube.com/watch?v={video}' target='_blank' rel='noopener'>{title}</a>"
+            lines.append(f"{emoji} {title} - {rng.choice(REASONS)}。{rng.choice(REASONS)}ので、今の気分に合います。")
+    return "\n".join(lines)
+
+
+def _median_ms(fn, runs):
+    samples = []
+    for _ in range(runs):
+        t = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - t) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000, help="ログの件数")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    app = server.app
+    with app.app_context():
+        init_db()
+        user = User(username="bench", email="bench@example.com", password_hash="-")
+        db.session.add(user)
+        db.session.commit()
+        start = datetime(2025, 1, 1)
+        rng = random.Random(0)
+        db.session.execute(db.insert(Log), [
+            {
+                "user_id": user.id,
+                "message": _reply(rng) if i % 2 else rng.choice(REASONS) + f"気分 #{i}",
+                "role": "assistant" if i % 2 else "user",
+                "timestamp": start + timedelta(minutes=i),
+            } for i in range(args.rows)
+        ])
+        db.session.commit()
+        user_id = user.id
+        payload = [
+            {"id": l.id, "message": l.message, "role": l.role, "timestamp": l.timestamp.isoformat()}
+            for l in Log.query.filter_by(user_id=user_id).all()
+        ]
+
+    print(f"rows: {args.rows}")
+    print("--- serialization (provider.response) ---")
+    with app.test_request_context():
+        for name, provider_class in jsonprovider.PROVIDERS.items():
+            if name == "orjson" and jsonprovider.orjson is None:
+                print("orjson : not installed")
+                continue
+            provider = provider_class(app)
+            body = provider.response(payload).get_data()
+            ms = _median_ms(lambda: provider.response(payload).get_data(), args.runs)
+            print(f"{name:<7}: {ms:7.1f} ms  {len(body) / 1024:8.0f} KB")
+
+        print("--- compression of the orjson/std body ---")
+        body = app.json.response(payload).get_data()
+        for encoding in ("gzip", "br"):
+            if encoding == "br" and compression.brotli is None:
+                print("br     : brotli not installed")
+                continue
+            out = compression.compress(body, encoding)
+            ms = _median_ms(lambda: compression.compress(body, encoding), args.runs)
+            print(f"{encoding:<7}: {ms:7.1f} ms  {len(out) / 1024:8.0f} KB ({len(out) / len(body):.0%})")
+
+    print("--- GET /api/logs end to end ---")
+    client = app.test_client()
+    with app.app_context():
+        from flask_jwt_extended import create_access_token
+        token = create_access_token(identity=str(user_id))
+    for accept in ("identity", "gzip", "br, gzip"):
+        headers = {"Authorization": f"Bearer {token}", "Accept-Encoding": accept}
+        res = client.get("/api/logs", headers=headers)
+        ms = _median_ms(lambda: client.get("/api/logs", headers=headers), args.runs)
+        encoding = res.headers.get("Content-Encoding", "identity")
+        print(f"{accept:<9}: {ms:7.1f} ms  {len(res.data) / 1024:8.0f} KB on wire ({encoding})")
+
+
+if __name__ == "__main__":
+    main()
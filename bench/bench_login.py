@@ -0,0 +1,79 @@
+"""
+ログイン処理のベンチマーク（1ワーカー相当）。
+
+ログインを並列に投げ続けながら /api/health の応答時間を測り、
+パスワードハッシュの負荷が軽いエンドポイントを巻き込まないかを見る。
+
+    python bench/bench_login.py --threads 8 --seconds 10
+    PASSWORD_HASH_METHOD=pbkdf2:sha256:300000 python bench/bench_login.py
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_tmpdir = tempfile.mkdtemp(prefix="bench_login_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'bench.db')}")
+os.environ.setdefault("GOVERNOR_DB_PATH", os.path.join(_tmpdir, "governor.db"))
+
+import server  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--threads", type=int, default=8, help="ログインを投げる並列数")
+    parser.add_argument("--seconds", type=float, default=10, help="計測時間")
+    args = parser.parse_args()
+
+    with server.app.app_context():
+        server.init_db()
+    client = server.app.test_client()
+    client.post("/api/register", json={"username": "bench", "email": "bench@example.com", "password": "pw"})
+
+    stop = time.monotonic() + args.seconds
+    counts = {"ok": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+
+    def login_loop():
+        c = server.app.test_client()
+        while time.monotonic() < stop:
+            res = c.post("/api/login", json={"email": "bench@example.com", "password": "pw"})
+            key = "ok" if res.status_code == 200 else "busy" if res.status_code == 503 else "error"
+            with lock:
+                counts[key] += 1
+
+    health_ms = []
+
+    def health_loop():
+        c = server.app.test_client()
+        while time.monotonic() < stop:
+            t = time.perf_counter()
+            c.get("/api/health")
+            health_ms.append((time.perf_counter() - t) * 1000)
+            time.sleep(0.05)
+
+    threads = [threading.Thread(target=login_loop) for _ in range(args.threads)]
+    threads.append(threading.Thread(target=health_loop))
+    started = time.monotonic()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.monotonic() - started
+
+    print(f"hash method     : {server.passwords.HASH_METHOD} ({server.passwords.POOL_KIND} x{server.passwords.POOL_WORKERS})")
+    print(f"login ok/s      : {counts['ok'] / elapsed:.1f}")
+    print(f"login 503 / err : {counts['busy']} / {counts['error']}")
+    if health_ms:
+        health_ms.sort()
+        p95 = health_ms[int(len(health_ms) * 0.95) - 1] if len(health_ms) >= 20 else health_ms[-1]
+        print(f"/api/health ms  : p50={statistics.median(health_ms):.1f} p95={p95:.1f} (n={len(health_ms)})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+起動時間とワーカーごとのメモリ使用量の計測。
+
+1) モジュールの import（アプリ生成まで）にかかる時間を別プロセスで数回測る
+2) gunicorn を --preload あり/なしで起動し、全ワーカーが応答するまでの時間と
+   各ワーカーの RSS / PSS（/proc/<pid>/smaps_rollup、Linux のみ）を測る
+
+    python bench/bench_startup.py --module server --path /api/health
+    python bench/bench_startup.py --module app --path /login --workers 4
+"""
+import argparse
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _env(tmpdir):
+    env = dict(os.environ)
+    env.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tmpdir, 'bench.db')}")
+    env.setdefault("GOVERNOR_DB_PATH", os.path.join(tmpdir, "governor.db"))
+    env["PYTHONDONTWRITEBYTECODE"] = "1"
+    return env
+
+
+def measure_import(module, env, runs):
+    code = (
+        "import time; t = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - t)"
+    )
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run([sys.executable, "-W", "ignore", "-c", code], cwd=ROOT, env=env,
+                             capture_output=True, text=True, check=True)
+        samples.append(float(out.stdout.strip().splitlines()[-1]) * 1000)
+    return statistics.median(samples)
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(p) for p in f.read().split()]
+    except OSError:
+        return []
+
+
+def _memory_kb(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1].lower()] = int(parts[1])
+    return values
+
+
+def measure_gunicorn(module, path, env, workers, preload, port):
+    cmd = [sys.executable, "-m", "gunicorn", "-w", str(workers), "-b", f"127.0.0.1:{port}",
+           "--log-level", "warning", f"{module}:app"]
+    if preload:
+        cmd.insert(3, "--preload")
+    started = time.perf_counter()
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env)
+    try:
+        # 全ワーカーが起動して応答するまで待つ
+        ready = None
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if len(_children(proc.pid)) >= workers:
+                try:
+                    urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=2)
+                    ready = (time.perf_counter() - started) * 1000
+                    break
+                except Exception:
+                    pass
+            time.sleep(0.02)
+        # 各ワーカーに数回リクエストを通してから測る
+        for _ in range(workers * 4):
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=2)
+            except Exception:
+                pass
+        mems = [_memory_kb(pid) for pid in _children(proc.pid)]
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=30)
+    return ready, mems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="server", help="WSGI モジュール（app / server）")
+    parser.add_argument("--path", default="/api/health", help="起動確認に使うパス")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--runs", type=int, default=5, help="import 時間の計測回数")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = _env(tmpdir)
+    try:
+        # スキーマは事前に作っておく（初回作成のコストは含めない）
+        subprocess.run([sys.executable, "-m", "flask", "--app", args.module, "init-db"],
+                       cwd=ROOT, env=env, capture_output=True)
+        subprocess.run([sys.executable, "-W", "ignore", "-c", f"import {args.module}"],
+                       cwd=ROOT, env=env, capture_output=True)
+
+        print(f"import {args.module:<8}: {measure_import(args.module, env, args.runs):.0f} ms (median of {args.runs})")
+        if not shutil.which("gunicorn") and subprocess.run(
+                [sys.executable, "-c", "import gunicorn"], capture_output=True).returncode:
+            print("gunicorn が無いのでワーカーの計測は省略します")
+            return
+        for preload in (False, True):
+            ready, mems = measure_gunicorn(args.module, args.path, env, args.workers, preload, args.port)
+            label = "--preload" if preload else "no preload"
+            ready_text = f"{ready:.0f} ms" if ready is not None else "timeout"
+            if mems:
+                rss = statistics.mean(m["rss"] for m in mems) / 1024
+                pss = statistics.mean(m["pss"] for m in mems) / 1024
+                print(f"{label:<11}: ready {ready_text}, per worker RSS {rss:.1f} MB / PSS {pss:.1f} MB"
+                      f" (x{len(mems)})")
+            else:
+                print(f"{label:<11}: ready {ready_text}")
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,35 @@
+"""
+HTML版（app.py）と JSON API版（server.py）で共有するコア。
+
+モデル・上流APIの呼び出し・ログ操作などはここにまとめ、
+各フロントエンドは create_app() で作ったアプリにルートだけを追加する。
+"""
+from flask import Flask
+
+from core import cli, compression, config, jsonprovider, posters
+from core.models import db
+
+
+def create_app(import_name: str, **overrides) -> Flask:
+    """
+    共通設定・DB・flask コマンドを登録したアプリを返す。
+
+    import 時にはDBへ接続しない（スキーマ作成は flask init-db で行う）ので、
+    gunicorn --preload で親プロセスが読み込んでからワーカーを fork しても安全。
+    import_name はテンプレート・static の場所を決めるのでフロントエンドの __name__ を渡す。
+    """
+    app = Flask(import_name)
+    app.config["SECRET_KEY"] = config.SECRET_KEY
+    app.config["SQLALCHEMY_DATABASE_URI"] = config.DATABASE_URL
+    app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    app.config.update(overrides)
+
+    db.init_app(app)
+    jsonprovider.init_app(app, config.JSON_PROVIDER)
+    if config.COMPRESS_MIN_SIZE > 0:
+        compression.init_app(app, min_size=config.COMPRESS_MIN_SIZE,
+                             gzip_level=config.COMPRESS_GZIP_LEVEL, br_quality=config.COMPRESS_BR_QUALITY)
+    posters.init_app(app)
+    for command in cli.COMMANDS:
+        app.cli.add_command(command)
+    return app
@@ -0,0 +1,244 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+
+from flask import current_app, request, send_from_directory
+
+try:
+    import brotli
+except ImportError:  # brotli は任意（無ければ gzip のみ）
+    brotli = None
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow は任意（無ければ WebP を作らない）
+    Image = None
+
+# ================================
+# 静的ファイルのビルド（フィンガープリント + 事前圧縮）
+# ================================
+# flask build-assets で static/ 以下を static/dist/ にコピーする。
+# ファイル名には内容のハッシュを付け（script.js -> script.3f2a9c1b7e.js）、
+# テキストは .gz / .br、画像は .webp の版も作っておく。
+# manifest.json（元のパス -> ハッシュ付きのパス）があれば、
+# url_for('static', filename='script.js') はハッシュ付きのURLを返し、
+# そのURLは Cache-Control: immutable で配信するので再訪問時はリクエスト自体が発生しない。
+
+DIST_DIR = "dist"
+MANIFEST_NAME = "manifest.json"
+
+# ハッシュ付きURLは内容が変われば別のURLになるので1年キャッシュさせる
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+COMPRESSIBLE_EXTS = {".js", ".css", ".svg", ".json", ".txt", ".html", ".map"}
+# 中の /static/... を書き換えるファイル（JS内の画像パスなど）
+REWRITE_EXTS = {".js", ".css", ".html"}
+WEBP_EXTS = {".png", ".jpg", ".jpeg"}
+SKIP_FILES = {"Thumbs.db", ".DS_Store"}
+
+WEBP_QUALITY = int(os.getenv("ASSETS_WEBP_QUALITY", "80"))
+
+# (Accept-Encoding の名前, 拡張子) 優先順
+_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()[:10]
+
+
+def _hashed_name(rel_path: str, digest: str, ext=None) -> str:
+    stem, orig_ext = os.path.splitext(rel_path)
+    return f"{stem}.{digest}{ext or orig_ext}"
+
+
+def _write(path: str, data: bytes):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _webp(data: bytes):
+    if Image is None:
+        return None
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            buf = io.BytesIO()
+            img.save(buf, "WEBP", quality=WEBP_QUALITY, method=6)
+    except (OSError, ValueError) as e:
+        print(f"[assets] WebP 変換エラー: {e}")
+        return None
+    return buf.getvalue()
+
+
+def _sources(static_folder: str):
+    """static/ 以下の元ファイル（dist/ を除く）を相対パス（/ 区切り）で返す"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    for root, dirs, files in os.walk(static_folder):
+        dirs[:] = sorted(d for d in dirs if os.path.join(root, d) != dist)
+        for name in sorted(files):
+            if name in SKIP_FILES or name.startswith("."):
+                continue
+            rel = os.path.relpath(os.path.join(root, name), static_folder)
+            yield rel.replace(os.sep, "/")
+
+
+def build(static_folder: str, url_prefix: str = "/static", clean: bool = False) -> dict:
+    """
+    static/ をビルドして manifest を書き出し、サイズの集計を返す。
+    clean=True なら manifest に載らない古いファイルを dist/ から消す
+    （動作中のワーカーが古いURLを返している間は消さないこと）。
+    """
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+    stats = {"files": 0, "original": 0, "gzip": 0, "br": 0, "webp": 0, "webp_original": 0}
+
+    # 画像などを先に処理し、JS/CSS 内の /static/... をハッシュ付きのパスに書き換えられるようにする
+    sources = sorted(_sources(static_folder), key=lambda p: os.path.splitext(p)[1].lower() in REWRITE_EXTS)
+    ref_pattern = re.compile(re.escape(url_prefix.rstrip("/")) + r"/([\w./-]+)")
+
+    for rel in sources:
+        with open(os.path.join(static_folder, rel), "rb") as f:
+            data = f.read()
+        ext = os.path.splitext(rel)[1].lower()
+        if ext in REWRITE_EXTS:
+            text = data.decode("utf-8")
+            text = ref_pattern.sub(
+                lambda m: f"{url_prefix}/{DIST_DIR}/{manifest[m.group(1)]['file']}"
+                if m.group(1) in manifest else m.group(0),
+                text,
+            )
+            data = text.encode("utf-8")
+
+        entry = {"file": _hashed_name(rel, _content_hash(data))}
+        target = os.path.join(dist, entry["file"])
+        _write(target, data)
+        stats["files"] += 1
+        stats["original"] += len(data)
+
+        if ext in COMPRESSIBLE_EXTS:
+            encodings = []
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                _write(target + ".gz", gz)
+                encodings.append("gzip")
+                stats["gzip"] += len(gz)
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    _write(target + ".br", br)
+                    encodings.append("br")
+                    stats["br"] += len(br)
+            if encodings:
+                entry["encodings"] = encodings
+
+        if ext in WEBP_EXTS:
+            webp = _webp(data)
+            if webp is not None and len(webp) < len(data):
+                entry["webp"] = _hashed_name(rel, _content_hash(webp), ".webp")
+                _write(os.path.join(dist, entry["webp"]), webp)
+                stats["webp"] += len(webp)
+                stats["webp_original"] += len(data)
+
+        manifest[rel] = entry
+
+    _write(os.path.join(dist, MANIFEST_NAME),
+           json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode("utf-8"))
+
+    if clean:
+        keep = {MANIFEST_NAME}
+        for entry in manifest.values():
+            keep.add(entry["file"])
+            keep.update(entry["file"] + suffix for _, suffix in _ENCODINGS)
+            if "webp" in entry:
+                keep.add(entry["webp"])
+        for rel in list(_sources_in(dist)):
+            if rel not in keep:
+                os.remove(os.path.join(dist, rel))
+    return stats
+
+
+def _sources_in(folder: str):
+    for root, _, files in os.walk(folder):
+        for name in files:
+            yield os.path.relpath(os.path.join(root, name), folder).replace(os.sep, "/")
+
+
+def load_manifest(static_folder: str) -> dict:
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST_NAME), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+# ================================
+# 配信
+# ================================
+def init_app(app):
+    """
+    manifest があれば url_for('static') をハッシュ付きのURLにし、static の配信を差し替える。
+    manifest はワーカー起動時に1回だけ読む（build-assets 後はワーカーを再起動する）。
+    """
+    manifest = load_manifest(app.static_folder)
+    files = {}
+    for entry in manifest.values():
+        files[f"{DIST_DIR}/{entry['file']}"] = entry
+    app.extensions["assets"] = {"manifest": manifest, "files": files}
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        # debug 中は元のファイルを編集しながら確認できるよう書き換えない
+        if endpoint != "static" or current_app.debug:
+            return
+        entry = manifest.get(values.get("filename"))
+        if entry:
+            values["filename"] = f"{DIST_DIR}/{entry['file']}"
+
+    app.view_functions["static"] = send_asset
+
+
+def accepts_webp() -> bool:
+    # */* だけのクライアントには送らない（WebP を表示できない可能性がある）
+    return any(value == "image/webp" and quality > 0 for value, quality in request.accept_mimetypes)
+
+
+def send_asset(filename):
+    """
+    ハッシュ付きのファイルは immutable で返し、クライアントが受け付ければ
+    事前に作った .br / .gz / .webp を選ぶ。それ以外は通常の static 配信。
+    """
+    entry = current_app.extensions["assets"]["files"].get(filename)
+    if entry is None:
+        return current_app.send_static_file(filename)
+
+    path = filename
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    content_encoding = None
+    vary = []
+    if "webp" in entry:
+        vary.append("Accept")
+        if accepts_webp():
+            path, mimetype = f"{DIST_DIR}/{entry['webp']}", "image/webp"
+    if entry.get("encodings"):
+        vary.append("Accept-Encoding")
+        for encoding, suffix in _ENCODINGS:
+            if encoding in entry["encodings"] and request.accept_encodings[encoding]:
+                path += suffix
+                content_encoding = encoding
+                break
+
+    res = send_from_directory(current_app.static_folder, path, mimetype=mimetype,
+                              max_age=IMMUTABLE_MAX_AGE)
+    res.cache_control.public = True
+    res.cache_control.immutable = True
+    if content_encoding:
+        res.headers["Content-Encoding"] = content_encoding
+    for header in vary:
+        res.vary.add(header)
+    return res
@@ -0,0 +1,142 @@
+import os
+import threading
+import time
+from collections import deque
+
+# ================================
+# 上流APIごとのサーキットブレーカー
+# ================================
+# 直近の呼び出しで失敗（通信エラー・5xx・429）や遅い応答が一定の割合を超えたら「open」にし、
+# OPEN_SECONDS の間はその上流へ送信せずに即座に失敗させる（ワーカーがタイムアウト待ちで埋まらない）。
+# 期間が過ぎたら「half_open」で1件だけ試し、成功すれば closed に戻す。
+# 状態はワーカー（プロセス）ごとに持つ。呼び出しのたびに共有ストレージへ書かないため。
+
+# 判定に使う直近の呼び出し数
+WINDOW = int(os.getenv("BREAKER_WINDOW", "20"))
+# これより少ない呼び出し数では open にしない
+MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "5"))
+FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+# この秒数以上かかった呼び出しは「遅い」とみなす
+SLOW_SECONDS = float(os.getenv("BREAKER_SLOW_SECONDS", "5"))
+SLOW_RATE = float(os.getenv("BREAKER_SLOW_RATE", "0.5"))
+# open にしてから half_open で試すまでの秒数
+OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class _Breaker:
+    def __init__(self):
+        self.state = CLOSED
+        self.calls = deque(maxlen=WINDOW)  # (成功したか, 遅かったか)
+        self.opened_at = 0.0
+        self.probing = False
+        self.rejected = 0
+
+    def rates(self):
+        if not self.calls:
+            return 0.0, 0.0
+        failures = sum(1 for ok, _ in self.calls if not ok)
+        slow = sum(1 for _, is_slow in self.calls if is_slow)
+        return failures / len(self.calls), slow / len(self.calls)
+
+    def open(self, now: float):
+        self.state = OPEN
+        self.opened_at = now
+        self.probing = False
+
+    def close(self):
+        self.state = CLOSED
+        self.calls.clear()
+        self.probing = False
+
+
+_breakers = {}
+_lock = threading.Lock()
+
+
+def _get(name: str) -> _Breaker:
+    breaker = _breakers.get(name)
+    if breaker is None:
+        breaker = _breakers.setdefault(name, _Breaker())
+    return breaker
+
+
+def acquire(name: str):
+    """
+    送信してよいか。(送信可, half_open の試行か) を返す。
+    half_open 中は同時に1件だけ試行させ、他は送信しない。
+    """
+    now = time.monotonic()
+    with _lock:
+        breaker = _get(name)
+        if breaker.state == OPEN:
+            if now - breaker.opened_at < OPEN_SECONDS:
+                breaker.rejected += 1
+                return False, False
+            breaker.state = HALF_OPEN
+        if breaker.state == HALF_OPEN:
+            if breaker.probing:
+                breaker.rejected += 1
+                return False, False
+            breaker.probing = True
+            return True, True
+        return True, False
+
+
+def release(name: str, probe: bool):
+    """acquire したが送信しなかった（予算不足など）"""
+    if probe:
+        with _lock:
+            _get(name).probing = False
+
+
+def record(name: str, ok: bool, elapsed: float, probe: bool = False):
+    """呼び出し結果を記録し、必要なら状態を切り替える"""
+    now = time.monotonic()
+    slow = elapsed >= SLOW_SECONDS
+    with _lock:
+        breaker = _get(name)
+        if probe:
+            if ok and not slow:
+                breaker.close()
+            else:
+                breaker.open(now)
+            return
+        breaker.calls.append((ok, slow))
+        if breaker.state == CLOSED and len(breaker.calls) >= MIN_CALLS:
+            failure_rate, slow_rate = breaker.rates()
+            if failure_rate >= FAILURE_RATE or slow_rate >= SLOW_RATE:
+                breaker.open(now)
+
+
+def is_open(name: str) -> bool:
+    """今送信すれば即座に失敗するか（half_open で試行中の場合も含む）"""
+    with _lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            return False
+        if breaker.state == OPEN:
+            return time.monotonic() - breaker.opened_at < OPEN_SECONDS
+        return breaker.state == HALF_OPEN and breaker.probing
+
+
+def snapshot() -> dict:
+    """/api/health 用の状態（このワーカーのもの）"""
+    now = time.monotonic()
+    result = {}
+    with _lock:
+        for name, breaker in sorted(_breakers.items()):
+            failure_rate, slow_rate = breaker.rates()
+            state = {
+                "state": breaker.state,
+                "calls": len(breaker.calls),
+                "failure_rate": round(failure_rate, 2),
+                "slow_rate": round(slow_rate, 2),
+                "rejected": breaker.rejected,
+            }
+            if breaker.state == OPEN:
+                state["retry_in"] = round(max(0.0, OPEN_SECONDS - (now - breaker.opened_at)), 1)
+            result[name] = state
+    return result
+
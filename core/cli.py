@@ -0,0 +1,108 @@
+import json
+from datetime import datetime, timedelta
+
+import click
+import requests
+from flask import current_app
+
+from core import assets, config, logstore, moods, pools, recommend, upstream
+from core.models import PoolEntry, User, db, init_db
+
+# ================================
+# flask コマンド（create_app() で登録）
+# ================================
+
+
+@click.command("init-db")
+def init_db_command():
+    """テーブル・インデックス・全文検索を作成する（デプロイ時に1回）"""
+    init_db()
+    click.echo("データベースを初期化しました")
+
+
+@click.command("rebuild-activity")
+def rebuild_activity_command():
+    """既存ログから日別アクティビティ集計（daily_activity）を作り直す"""
+    count = logstore.rebuild_activity(db.session)
+    click.echo(f"{count} 日分の集計を作成しました")
+
+
+@click.command("build-pools")
+@click.option("--per-key", default=3, show_default=True, help="1つの組み合わせあたりの件数")
+@click.option("--mode", "modes", multiple=True, help="対象モード（省略時は全モード）")
+@click.option("--mbti", "mbti_types", multiple=True, help="対象MBTI（省略時は登録ユーザーのMBTI）")
+def build_pools_command(per_key, modes, mbti_types):
+    """よく使われる (MBTI, 天気, 気分, モード) の推薦結果を事前生成する"""
+    modes = modes or pools.MODES
+    if not mbti_types:
+        rows = db.session.query(User.mbti_type).distinct().all()
+        mbti_types = sorted({pools.mbti_key(m) for (m,) in rows}) or ["-"]
+
+    # 天気は登録ユーザーの都市の「現在」の天気だけを対象にする
+    cities = {c or "Tokyo" for (c,) in db.session.query(User.city).distinct().all()} or {"Tokyo"}
+    weathers = {}
+    for city in sorted(cities):
+        weather, temp = recommend.get_weather(city)
+        weathers.setdefault(pools.weather_bucket(weather, temp), (weather, temp))
+
+    cutoff = datetime.utcnow() - timedelta(hours=config.RECO_POOL_TTL_HOURS)
+    PoolEntry.query.filter(PoolEntry.created_at < cutoff).delete()
+    db.session.commit()
+
+    # 未設定ならリンクは最初から付かないので、リンクが無いことを理由にスキップしない
+    youtube = recommend.youtube_configured()
+    if not youtube:
+        click.echo("YOUTUBE_API_KEY が未設定のため、曲の YouTube リンクは付けずに生成します")
+
+    created = 0
+    for mbti in mbti_types:
+        for weather, temp in weathers.values():
+            for mood_key, (mood_text, _) in moods.VOCABULARY.items():
+                for mode in modes:
+                    key = pools.pool_key(mbti, weather, temp, mood_key, mode)
+                    have = PoolEntry.query.filter(
+                        PoolEntry.pool_key == key, PoolEntry.created_at >= cutoff
+                    ).count()
+                    for _ in range(per_key - have):
+                        prompt = recommend.build_prompt(mbti if mbti != "-" else None, weather, temp, mood_text, mode)
+                        try:
+                            # ユーザーの予算を圧迫しないよう enrichment 扱いで生成する
+                            result = recommend.generate_recommendation(prompt, mode, priority="enrichment")
+                        except upstream.QuotaExceeded as e:
+                            click.echo(f"予算不足のため中断します: {e}")
+                            click.echo(f"{created} 件生成しました")
+                            return
+                        except (requests.exceptions.RequestException, KeyError, IndexError) as e:
+                            click.echo(f"[{key}] 生成エラー: {e}")
+                            break
+                        if youtube and any(song["youtube"] == "#" for song in result["songs"]):
+                            # YouTube を省かれた（予算不足・障害中）結果はリンク切れのままプールに残るので保存しない
+                            click.echo(f"[{key}] YouTube のリンクを取得できなかったためスキップします")
+                            break
+                        db.session.add(PoolEntry(
+                            pool_key=key,
+                            raw_text=result["raw_text"],
+                            payload=json.dumps(recommend.response_payload(result), ensure_ascii=False),
+                        ))
+                        db.session.commit()
+                        created += 1
+    click.echo(f"{created} 件生成しました")
+
+
+@click.command("build-assets")
+@click.option("--clean", is_flag=True, help="manifest に無い古いファイルを削除する（全ワーカーの再起動後に）")
+def build_assets_command(clean):
+    """static/ をハッシュ付きファイル名・事前圧縮・WebP 付きで static/dist/ にビルドする"""
+    stats = assets.build(current_app.static_folder, current_app.static_url_path, clean=clean)
+    click.echo(f"{stats['files']} ファイル（{stats['original'] / 1024:.0f} KB）をビルドしました")
+    if stats["gzip"] or stats["br"]:
+        click.echo(f"  gzip: {stats['gzip'] / 1024:.0f} KB / brotli: {stats['br'] / 1024:.0f} KB"
+                   + ("" if assets.brotli else "（brotli 未インストール）"))
+    if assets.Image is None:
+        click.echo("  Pillow 未インストールのため WebP は作成していません")
+    elif stats["webp_original"]:
+        click.echo(f"  WebP: {stats['webp_original'] / 1024:.0f} KB -> {stats['webp'] / 1024:.0f} KB")
+    click.echo("反映するにはワーカーを再起動してください")
+
+
+COMMANDS = (init_db_command, rebuild_activity_command, build_pools_command, build_assets_command)
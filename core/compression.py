@@ -0,0 +1,67 @@
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli は任意（無ければ gzip のみ）
+    brotli = None
+
+# ================================
+# 応答の圧縮（JSON など）
+# ================================
+# Accept-Encoding を見て br / gzip で圧縮する。小さい応答は圧縮しても得にならないので
+# min_size 未満はそのまま返す。ストリーミング応答（/api/logs/export など）は対象外。
+
+DEFAULT_MIMETYPES = ("application/json",)
+
+
+def _choose_encoding(use_brotli: bool):
+    if use_brotli and brotli is not None and request.accept_encodings["br"]:
+        return "br"
+    if request.accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress(data: bytes, encoding: str, gzip_level: int = 6, br_quality: int = 5) -> bytes:
+    # 応答ごとに圧縮するので、静的ファイル（build-assets は最大圧縮）より軽い設定にする
+    if encoding == "br":
+        return brotli.compress(data, quality=br_quality)
+    return gzip.compress(data, compresslevel=gzip_level, mtime=0)
+
+
+def init_app(app, min_size: int = 1024, mimetypes=DEFAULT_MIMETYPES,
+             gzip_level: int = 6, br_quality: int = 5, use_brotli: bool = True):
+    """after_request で条件に合う応答を圧縮する"""
+
+    @app.after_request
+    def compress_response(response):
+        if (
+            response.direct_passthrough
+            or response.is_streamed
+            or response.status_code < 200
+            or response.status_code in (204, 206, 304)
+            or "Content-Encoding" in response.headers
+            or response.mimetype not in mimetypes
+        ):
+            return response
+        # 同じURLでも Accept-Encoding で中身が変わることをキャッシュに伝える
+        response.vary.add("Accept-Encoding")
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        encoding = _choose_encoding(use_brotli)
+        if encoding is None:
+            return response
+
+        body = compress(data, encoding, gzip_level, br_quality)
+        response.set_data(body)
+        response.headers["Content-Encoding"] = encoding
+        # 圧縮後は別のバイト列なので弱い ETag にする（弱い比較の If-None-Match ならそのまま一致する）
+        etag, _ = response.get_etag()
+        if etag:
+            response.set_etag(etag, weak=True)
+        return response
+
+    return app
@@ -0,0 +1,48 @@
+import os
+
+from dotenv import load_dotenv
+
+# ================================
+# 環境変数（HTML版・API版で共通）
+# ================================
+load_dotenv()
+
+# 相対パスの SQLite は instance/ 配下に作られる
+SECRET_KEY = os.getenv("SECRET_KEY") or "your_secret_key"
+DATABASE_URL = os.getenv("DATABASE_URL") or "sqlite:///app.db"
+
+GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "")
+GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
+YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "")
+GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
+OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
+TMDB_API_KEY = os.getenv("TMDB_API_KEY", "")
+
+# 上流APIのタイムアウト（秒）
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", "15"))
+GEMINI_TIMEOUT = float(os.getenv("GEMINI_TIMEOUT", "30"))
+
+# playlist などで先頭から何曲までを core 扱いでYouTube検索するか（残りは enrichment）
+YOUTUBE_CORE_LINKS = int(os.getenv("YOUTUBE_CORE_LINKS", "3"))
+
+# YouTube / TMDB 検索・バッチ生成で同時に投げる上流リクエスト数（ワーカーごと）
+UPSTREAM_FANOUT = int(os.getenv("UPSTREAM_FANOUT", "8"))
+# /api/ai/batch で1回に受け付ける (気分, モード) の組み合わせ数
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "4"))
+
+# 事前生成した推薦プールから返すか / プールの有効期限（時間）
+RECO_POOL_ENABLED = os.getenv("RECO_POOL_ENABLED", "1") == "1"
+RECO_POOL_TTL_HOURS = int(os.getenv("RECO_POOL_TTL_HOURS", "24"))
+
+# 天気キャッシュの有効期限（秒）
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", "600"))
+# 期限切れの天気を「取り直すまでの間」返してよい秒数（上流の障害中もこの範囲で古い値を返す）
+WEATHER_STALE_TTL = int(os.getenv("WEATHER_STALE_TTL", "10800"))
+
+# JSON のシリアライズ: orjson / std（orjson が無ければ std）
+JSON_PROVIDER = os.getenv("JSON_PROVIDER", "orjson")
+
+# JSON 応答の圧縮（COMPRESS_MIN_SIZE バイト以上を br / gzip で圧縮。0 で無効）
+COMPRESS_MIN_SIZE = int(os.getenv("COMPRESS_MIN_SIZE", "1024"))
+COMPRESS_GZIP_LEVEL = int(os.getenv("COMPRESS_GZIP_LEVEL", "6"))
+COMPRESS_BR_QUALITY = int(os.getenv("COMPRESS_BR_QUALITY", "5"))
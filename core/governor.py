@@ -0,0 +1,150 @@
+import os
+import time
+import sqlite3
+
+# ================================
+# 上流APIのクォータ/レート制御（トークンバケット）
+# ================================
+# 状態は SQLite ファイルに置くため、gunicorn の複数ワーカー間で共有される。
+# バケットは「上流全体」と「上流×ユーザー」の2段。1人のユーザーが
+# 全体の予算を使い切らないよう、ユーザー側の容量は全体の一部に制限する。
+
+# 名前 -> (容量を上書きする環境変数, 既定の容量, 補充周期[秒], 1回あたりのコスト)
+BUDGETS = {
+    # YouTube Data API: 1日 10,000 ユニット、search は1回 100 ユニット
+    "youtube": ("YOUTUBE_DAILY_QUOTA", 10000, 86400, 100),
+    # Gemini: 1分あたりのリクエスト数
+    "gemini": ("GEMINI_RPM", 60, 60, 1),
+}
+
+PRIORITIES = ("core", "enrichment")
+
+
+def _db_path() -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    default = os.path.join(root, "instance", "governor.db")
+    return os.getenv("GOVERNOR_DB_PATH", default)
+
+
+def _user_share() -> float:
+    """1ユーザーが使える割合（全体容量に対する比率）"""
+    return float(os.getenv("GOVERNOR_USER_SHARE", "0.2"))
+
+
+def _enrichment_reserve() -> float:
+    """全体の残りがこの割合を下回ったら enrichment を捨てて core に回す"""
+    return float(os.getenv("GOVERNOR_ENRICHMENT_RESERVE", "0.2"))
+
+
+def _max_wait() -> float:
+    """core リクエストが補充を待つ最大秒数"""
+    return float(os.getenv("GOVERNOR_MAX_WAIT", "2"))
+
+
+def _budget(name: str):
+    env_name, default, period, cost = BUDGETS[name]
+    capacity = float(os.getenv(env_name) or default)
+    return capacity, period, cost
+
+
+def _connect() -> sqlite3.Connection:
+    path = _db_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS buckets ("
+        "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)"
+    )
+    return conn
+
+
+def _refilled(conn, key: str, capacity: float, period: float, now: float) -> float:
+    row = conn.execute("SELECT tokens, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+    if row is None:
+        return capacity
+    tokens, updated = row
+    return min(capacity, tokens + (now - updated) * capacity / period)
+
+
+def _try_take(name: str, user_id, priority: str, cost: float):
+    """取得できたら (True, 0)、できなければ (False, 補充までの待ち秒数) を返す"""
+    capacity, period, _ = _budget(name)
+    user_capacity = capacity * _user_share()
+    reserve = capacity * _enrichment_reserve() if priority == "enrichment" else 0.0
+
+    buckets = [(name, capacity, reserve)]
+    if user_id is not None:
+        buckets.append((f"{name}:user:{user_id}", user_capacity, 0.0))
+
+    now = time.time()
+    conn = _connect()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        levels = [(key, cap, _refilled(conn, key, cap, period, now), floor) for key, cap, floor in buckets]
+        wait = 0.0
+        for key, cap, tokens, floor in levels:
+            needed = cost + floor
+            if tokens < needed:
+                if needed > cap:
+                    wait = float("inf")
+                else:
+                    wait = max(wait, (needed - tokens) * period / cap)
+        if wait > 0:
+            conn.execute("ROLLBACK")
+            return False, wait
+        for key, cap, tokens, _ in levels:
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated = excluded.updated",
+                (key, tokens - cost, now),
+            )
+        conn.execute("COMMIT")
+        return True, 0.0
+    finally:
+        conn.close()
+
+
+def acquire(name: str, user_id=None, priority: str = "core", cost=None) -> bool:
+    """
+    上流 name の予算を消費する。予算が無ければ False。
+
+    enrichment は残量が予約分を下回った時点で即座に捨てる。
+    core は補充が GOVERNOR_MAX_WAIT 秒以内に見込めるなら待つ。
+    """
+    if name not in BUDGETS:
+        return True
+    if cost is None:
+        cost = _budget(name)[2]
+
+    deadline = time.monotonic() + _max_wait()
+    while True:
+        ok, wait = _try_take(name, user_id, priority, cost)
+        if ok:
+            return True
+        if priority != "core" or time.monotonic() + wait > deadline:
+            return False
+        time.sleep(min(wait, 0.5))
+
+
+def snapshot() -> dict:
+    """/api/health 用：上流ごとの残り予算"""
+    now = time.time()
+    result = {}
+    try:
+        conn = _connect()
+    except sqlite3.Error as e:
+        return {"error": str(e)}
+    try:
+        for name in BUDGETS:
+            capacity, period, cost = _budget(name)
+            remaining = _refilled(conn, name, capacity, period, now)
+            result[name] = {
+                "remaining": round(remaining, 1),
+                "capacity": capacity,
+                "period_seconds": period,
+                "cost_per_call": cost,
+                "enrichment_available": remaining >= cost + capacity * _enrichment_reserve(),
+            }
+    finally:
+        conn.close()
+    return result
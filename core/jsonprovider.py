@@ -0,0 +1,64 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson は任意（無ければ標準の json）
+    orjson = None
+
+# ================================
+# JSON のシリアライズ（jsonify / request.get_json）
+# ================================
+# orjson は標準の json より数倍速く、日本語を \uXXXX にせず UTF-8 のまま出すので応答も小さくなる。
+# 日付などの変換は Flask 既定の default（http_date など）に任せ、出力の形は変えない。
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    ensure_ascii = False
+
+    def _options(self, indent=False) -> int:
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def _dumps_bytes(self, obj, indent=False) -> bytes:
+        return orjson.dumps(obj, default=self.default, option=self._options(indent))
+
+    def dumps(self, obj, **kwargs) -> str:
+        # orjson が対応しない引数（separators 以外の細かい指定）は標準の json に任せる
+        indent = kwargs.pop("indent", None)
+        kwargs.pop("separators", None)
+        if kwargs or indent not in (None, 2):
+            return super().dumps(obj, indent=indent, **kwargs)
+        try:
+            return self._dumps_bytes(obj, indent=indent == 2).decode("utf-8")
+        except orjson.JSONEncodeError:
+            # 64bit を超える整数など
+            return super().dumps(obj, indent=indent)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = self._dumps_bytes(obj, indent=indent)
+        except orjson.JSONEncodeError:
+            return super().response(obj)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+PROVIDERS = {"std": DefaultJSONProvider, "orjson": OrjsonProvider}
+
+
+def init_app(app, name: str = "orjson"):
+    """JSON プロバイダを差し替える（orjson が無ければ標準のまま）"""
+    if name == "orjson" and orjson is None:
+        name = "std"
+    app.json = PROVIDERS.get(name, DefaultJSONProvider)(app)
+    return name
@@ -0,0 +1,145 @@
+from sqlalchemy import DateTime, Integer, String, text
+from sqlalchemy.exc import OperationalError, ProgrammingError
+
+# ================================
+# ログの全文検索
+# ================================
+# SQLite: FTS5 仮想テーブル logs_fts（logs を外部コンテンツとして参照）をトリガーで同期する。
+#         日本語は単語区切りが無いので trigram トークナイザを使う（3文字未満の語は LIKE で補う）。
+# PostgreSQL: pg_trgm の GIN インデックスで ILIKE を高速化し、similarity() で並べる。
+
+# 検索方式: "fts5" / "pg_trgm" / "like"（どちらも使えない場合）。
+# install()（flask init-db）で決まるほか、ワーカーでは最初の検索時に既存のインデックスから判定する
+_backend = None
+
+_SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS logs_fts USING fts5(
+        message, content='logs', content_rowid='id', tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_ai AFTER INSERT ON logs BEGIN
+        INSERT INTO logs_fts(rowid, message) VALUES (new.id, new.message);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_ad AFTER DELETE ON logs BEGIN
+        INSERT INTO logs_fts(logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS logs_fts_au AFTER UPDATE OF message ON logs BEGIN
+        INSERT INTO logs_fts(logs_fts, rowid, message) VALUES ('delete', old.id, old.message);
+        INSERT INTO logs_fts(rowid, message) VALUES (new.id, new.message);
+    END""",
+]
+
+_POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_logs_message_trgm ON logs USING gin (message gin_trgm_ops)",
+]
+
+# trigram トークナイザで MATCH できる最短の語長
+_MIN_TERM = 3
+
+
+def install(engine) -> str:
+    """検索用のインデックスとトリガーを用意する（init_db() から create_all() の後に呼ぶ）"""
+    global _backend
+    try:
+        with engine.begin() as conn:
+            if engine.dialect.name == "sqlite":
+                existed = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE name = 'logs_fts'")
+                ).first()
+                for ddl in _SQLITE_DDL:
+                    conn.execute(text(ddl))
+                if not existed:
+                    # 既存ログを取り込む
+                    conn.execute(text("INSERT INTO logs_fts(logs_fts) VALUES ('rebuild')"))
+                _backend = "fts5"
+            elif engine.dialect.name == "postgresql":
+                for ddl in _POSTGRES_DDL:
+                    conn.execute(text(ddl))
+                _backend = "pg_trgm"
+    except (OperationalError, ProgrammingError) as e:
+        # FTS5/trigram が無い SQLite や拡張を作れない権限では LIKE 検索で代替する
+        print(f"[logsearch] 全文検索インデックスを作成できませんでした（LIKE検索で代替）: {e}")
+        _backend = "like"
+    return _backend
+
+
+def backend(session) -> str:
+    """DDL は実行せず、インデックスの有無だけを見て検索方式を決める"""
+    global _backend
+    if _backend is None:
+        engine = session.get_bind()
+        if engine.dialect.name == "sqlite":
+            sql = "SELECT 1 FROM sqlite_master WHERE name = 'logs_fts'"
+            found = "fts5"
+        elif engine.dialect.name == "postgresql":
+            sql = "SELECT 1 FROM pg_indexes WHERE indexname = 'ix_logs_message_trgm'"
+            found = "pg_trgm"
+        else:
+            sql, found = None, "like"
+        if sql is not None and session.execute(text(sql)).first() is None:
+            found = "like"
+        _backend = found
+    return _backend
+
+
+def _escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search(session, user_id: int, query: str, page: int = 1, per_page: int = 20):
+    """
+    user_id のログから query（空白区切りはAND）を含むものを関連度順に返す。
+    (結果のリスト, 次のページがあるか) を返す。総件数は数えない。
+    """
+    terms = [t for t in (query or "").split() if t]
+    if not terms:
+        return [], False
+    page = max(page, 1)
+    per_page = max(1, min(per_page, 100))
+    params = {"uid": user_id, "limit": per_page + 1, "offset": (page - 1) * per_page}
+    mode = backend(session)
+
+    like_terms = terms
+    match_terms = []
+    if mode == "fts5":
+        match_terms = [t for t in terms if len(t) >= _MIN_TERM]
+        like_terms = [t for t in terms if len(t) < _MIN_TERM]
+
+    like_sql = ""
+    for i, term in enumerate(like_terms):
+        op = "ILIKE" if mode == "pg_trgm" else "LIKE"
+        like_sql += f" AND l.message {op} :like{i} ESCAPE '\\'"
+        params[f"like{i}"] = f"%{_escape_like(term)}%"
+
+    if match_terms:
+        # 各語をフレーズとして引用し、FTS5 の構文として解釈されないようにする
+        params["match"] = " ".join('"' + t.replace('"', '""') + '"' for t in match_terms)
+        sql = f"""
+            SELECT l.id, l.role, l.timestamp,
+                   snippet(logs_fts, 0, '<mark>', '</mark>', '…', 24) AS snippet
+            FROM logs_fts JOIN logs l ON l.id = logs_fts.rowid
+            WHERE logs_fts MATCH :match AND l.user_id = :uid{like_sql}
+            ORDER BY bm25(logs_fts), l.timestamp DESC
+            LIMIT :limit OFFSET :offset
+        """
+    elif mode == "pg_trgm":
+        params["q"] = query
+        sql = f"""
+            SELECT l.id, l.role, l.timestamp, left(l.message, 200) AS snippet
+            FROM logs l
+            WHERE l.user_id = :uid{like_sql}
+            ORDER BY similarity(l.message, :q) DESC, l.timestamp DESC
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        sql = f"""
+            SELECT l.id, l.role, l.timestamp, substr(l.message, 1, 200) AS snippet
+            FROM logs l
+            WHERE l.user_id = :uid{like_sql}
+            ORDER BY l.timestamp DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    stmt = text(sql).columns(id=Integer, role=String, timestamp=DateTime, snippet=String)
+    rows = session.execute(stmt, params).all()
+    return rows[:per_page], len(rows) > per_page
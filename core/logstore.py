@@ -0,0 +1,244 @@
+from datetime import date, datetime, time, timedelta
+
+from sqlalchemy import case, delete, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from core.models import DailyActivity, Log
+
+# ================================
+# ログの一括操作（HTML版・API版で共通）
+# ================================
+# DailyActivity は「ユーザー×日」ごとの件数・モード・最初/最後の時刻を持つ集計テーブルで、
+# ログの追加・削除のたびに該当日だけを更新する。
+
+# 1トランザクションで消す最大行数。SQLite の書き込みロックを長く握らないよう小分けにする
+BULK_DELETE_CHUNK = 500
+
+
+def parse_date(value):
+    """
+    YYYY-MM-DD または ISO 8601 を datetime にする。
+    (datetime, 日付のみ指定か) を返す。未指定なら (None, False)。
+    """
+    if not value:
+        return None, False
+    if len(value) == 10:
+        return datetime.strptime(value, "%Y-%m-%d"), True
+    return datetime.fromisoformat(value), False
+
+
+def range_conditions(date_from=None, date_to=None, to_is_date=False, before=None):
+    """日付範囲の WHERE 条件。日付のみの date_to はその日を含む"""
+    conds = []
+    if date_from:
+        conds.append(Log.timestamp >= date_from)
+    if date_to:
+        conds.append(Log.timestamp < date_to + timedelta(days=1) if to_is_date else Log.timestamp <= date_to)
+    if before:
+        conds.append(Log.timestamp < before)
+    return conds
+
+
+def _as_date(value) -> date:
+    # SQLite の date() は文字列、PostgreSQL は date を返す
+    return value if isinstance(value, date) else date.fromisoformat(str(value))
+
+
+def _log_days(session, user_id: int, *conditions) -> set:
+    day_col = func.date(Log.timestamp)
+    rows = session.execute(select(day_col).where(Log.user_id == user_id, *conditions).distinct())
+    return {_as_date(d) for (d,) in rows if d is not None}
+
+
+def bulk_delete(session, user_id: int, ids=None, conditions=None, chunk_size: int = BULK_DELETE_CHUNK) -> int:
+    """
+    user_id のログを ids または条件で一括削除し、削除件数を返す。
+
+    1チャンクごとに DELETE ... WHERE user_id = ? AND ... を1文で実行してコミットする。
+    他ユーザーの id が混ざっていても user_id 条件で除外される。
+    削除があった日の集計も更新する。
+    """
+    total = 0
+    days = set()
+    if ids is not None:
+        ids = sorted({int(i) for i in ids})
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            days |= _log_days(session, user_id, Log.id.in_(chunk))
+            result = session.execute(
+                delete(Log).where(Log.user_id == user_id, Log.id.in_(chunk)),
+                execution_options={"synchronize_session": False},
+            )
+            session.commit()
+            total += result.rowcount
+    else:
+        if not conditions:
+            raise ValueError("削除条件が指定されていません")
+        days = _log_days(session, user_id, *conditions)
+        while True:
+            chunk_ids = select(Log.id).where(Log.user_id == user_id, *conditions).limit(chunk_size)
+            result = session.execute(
+                delete(Log).where(Log.user_id == user_id, Log.id.in_(chunk_ids.scalar_subquery())),
+                execution_options={"synchronize_session": False},
+            )
+            session.commit()
+            total += result.rowcount
+            if result.rowcount < chunk_size:
+                break
+
+    if total:
+        refresh_days(session, user_id, days)
+    return total
+
+
+# ================================
+# 日別アクティビティ集計
+# ================================
+def _add_mode(modes: str, mode) -> str:
+    names = [m for m in (modes or "").split(",") if m]
+    if mode and mode not in names:
+        names.append(mode)
+    return ",".join(names)
+
+
+def record_activity(session, user_id: int, timestamp: datetime, mode=None):
+    """
+    ログ1件の追加を集計に反映する（コミットは呼び出し側）。
+    複数ワーカーが同じ行を同時に更新しても件数を失わないよう、読み込まずに1文の UPDATE で加算する。
+    行が無ければ INSERT する（同時に作られた場合は add_log が IntegrityError で再試行する）。
+    """
+    table = DailyActivity.__table__
+    day = timestamp.date()
+    modes = func.coalesce(table.c.modes, "")
+    values = {
+        "count": table.c.count + 1,
+        "first_at": case((table.c.first_at <= timestamp, table.c.first_at), else_=timestamp),
+        "last_at": case((table.c.last_at >= timestamp, table.c.last_at), else_=timestamp),
+    }
+    if mode:
+        values["modes"] = case(
+            (("," + modes + ",").contains(f",{mode},", autoescape=True), modes),
+            (modes == "", mode),
+            else_=modes + "," + mode,
+        )
+    updated = session.execute(
+        update(table).where(table.c.user_id == user_id, table.c.day == day).values(**values)
+    )
+    if updated.rowcount == 0:
+        session.execute(insert(table).values(
+            user_id=user_id, day=day, count=1, modes=mode or "", first_at=timestamp, last_at=timestamp,
+        ))
+
+
+def add_log(session, user_id: int, message: str, role: str, mode=None):
+    """ログを追加し、同じトランザクションで日別集計も更新する"""
+    for attempt in range(2):
+        now = datetime.utcnow()
+        session.add(Log(user_id=user_id, message=message, role=role, timestamp=now))
+        record_activity(session, user_id, now, mode)
+        try:
+            session.commit()
+            return
+        except IntegrityError:
+            # 別ワーカーが同じ日の集計行を先に作った。作り直して再試行する
+            session.rollback()
+            if attempt:
+                raise
+
+
+def refresh_days(session, user_id: int, days):
+    """
+    指定日の件数・最初/最後の時刻をログから数え直す（削除後に使う）。
+    ログが無くなった日は集計行ごと消す。モードはログに残らないので既存の値を保つ。
+    """
+    days = sorted(set(days))
+    if not days:
+        return
+    start = datetime.combine(days[0], time.min)
+    end = datetime.combine(days[-1], time.min) + timedelta(days=1)
+    day_col = func.date(Log.timestamp)
+    rows = session.execute(
+        select(day_col, func.count(Log.id), func.min(Log.timestamp), func.max(Log.timestamp))
+        .where(Log.user_id == user_id, Log.timestamp >= start, Log.timestamp < end)
+        .group_by(day_col)
+    )
+    stats = {_as_date(d): (count, first_at, last_at) for d, count, first_at, last_at in rows}
+
+    for day in days:
+        row = session.get(DailyActivity, (user_id, day))
+        if day not in stats:
+            if row is not None:
+                session.delete(row)
+            continue
+        if row is None:
+            row = DailyActivity(user_id=user_id, day=day, modes="")
+            session.add(row)
+        row.count, row.first_at, row.last_at = stats[day]
+    session.commit()
+
+
+def rebuild_activity(session, user_id=None) -> int:
+    """
+    既存ログから日別集計を作り直す（集計テーブル導入前のデータの移行用）。
+    モードはログに残っていないため空になる。作成した行数を返す。
+    """
+    # create_all() は既存テーブルに後から足したインデックスを作らないのでここで作る
+    for index in Log.__table__.indexes:
+        index.create(session.get_bind(), checkfirst=True)
+
+    cleanup = delete(DailyActivity)
+    conds = []
+    if user_id is not None:
+        cleanup = cleanup.where(DailyActivity.user_id == user_id)
+        conds.append(Log.user_id == user_id)
+    session.execute(cleanup)
+
+    day_col = func.date(Log.timestamp)
+    rows = session.execute(
+        select(Log.user_id, day_col, func.count(Log.id), func.min(Log.timestamp), func.max(Log.timestamp))
+        .where(*conds)
+        .group_by(Log.user_id, day_col)
+    ).all()
+    session.add_all(
+        DailyActivity(user_id=uid, day=_as_date(d), count=count, modes="", first_at=first_at, last_at=last_at)
+        for uid, d, count, first_at, last_at in rows
+    )
+    session.commit()
+    return len(rows)
+
+
+def backfill_activity(session, user_id: int) -> int:
+    """
+    集計テーブル導入前のログの日別集計を作る（最も古いログの日が集計済みなら何もしない）。
+    導入後に記録された行（モード付き）はそのまま残す。作成した行数を返す。
+    """
+    oldest = session.execute(select(func.min(Log.timestamp)).where(Log.user_id == user_id)).scalar()
+    if oldest is None or session.get(DailyActivity, (user_id, oldest.date())) is not None:
+        return 0
+
+    first_day = session.execute(
+        select(func.min(DailyActivity.day)).where(DailyActivity.user_id == user_id)
+    ).scalar()
+    conds = [Log.user_id == user_id]
+    if first_day is not None:
+        conds.append(Log.timestamp < datetime.combine(_as_date(first_day), time.min))
+    day_col = func.date(Log.timestamp)
+    rows = session.execute(
+        select(day_col, func.count(Log.id), func.min(Log.timestamp), func.max(Log.timestamp))
+        .where(*conds)
+        .group_by(day_col)
+    ).all()
+    session.add_all(
+        DailyActivity(user_id=user_id, day=_as_date(d), count=count, modes="", first_at=first_at, last_at=last_at)
+        for d, count, first_at, last_at in rows
+    )
+    try:
+        session.commit()
+    except IntegrityError:
+        # 別のリクエストが先に作った
+        session.rollback()
+        return 0
+    if first_day is not None:
+        # 導入した日は、導入前のログも含めて数え直す
+        refresh_days(session, user_id, [_as_date(first_day)])
+    return len(rows)
@@ -0,0 +1,87 @@
+from datetime import datetime
+
+from flask_login import UserMixin
+from flask_sqlalchemy import SQLAlchemy
+
+from core import logsearch, passwords
+
+# アプリには create_app() で結び付ける
+db = SQLAlchemy()
+
+
+# ================================
+# モデル定義
+# ================================
+class User(UserMixin, db.Model):
+    __tablename__ = "user"
+    id = db.Column(db.Integer, primary_key=True)
+    username = db.Column(db.String(150), nullable=False)
+    email = db.Column(db.String(150), unique=True, nullable=False, index=True)
+    password_hash = db.Column(db.String(255), nullable=False)  # scrypt は約160文字
+    mbti_type = db.Column(db.String(4), nullable=True)
+    city = db.Column(db.String(50), nullable=True)
+
+    def set_password(self, password: str):
+        self.password_hash = passwords.hash_password(password)
+
+    def check_password(self, password: str) -> bool:
+        """照合に成功し、ハッシュのコスト設定が変わっていれば作り直す（コミットは呼び出し側）"""
+        ok = passwords.verify_password(self.password_hash, password)
+        if ok and passwords.needs_rehash(self.password_hash):
+            self.set_password(password)
+        return ok
+
+
+class Log(db.Model):
+    __tablename__ = "logs"
+    __table_args__ = (db.Index("ix_logs_user_timestamp", "user_id", "timestamp"),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
+    message = db.Column(db.Text, nullable=False)
+    role = db.Column(db.String(20), nullable=False)  # "user" or "assistant"
+    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+    user = db.relationship("User", backref="logs")
+
+
+class DailyActivity(db.Model):
+    """ユーザー×日ごとのログ件数・モード・最初/最後の時刻（insert_log / 削除時に更新）"""
+    __tablename__ = "daily_activity"
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    modes = db.Column(db.String(100), nullable=False, default="")  # カンマ区切り
+    first_at = db.Column(db.DateTime)
+    last_at = db.Column(db.DateTime)
+
+
+class PoolEntry(db.Model):
+    """(MBTI, 天気バケット, 気分クラスタ, モード) ごとの事前生成済み推薦結果"""
+    __tablename__ = "recommendation_pool"
+    id = db.Column(db.Integer, primary_key=True)
+    pool_key = db.Column(db.String(100), nullable=False, index=True)
+    raw_text = db.Column(db.Text, nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # /api/ai の応答JSON（エンリッチ済み）
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+
+def insert_log(user_id: int, message: str, role: str, mode=None):
+    from core import logstore  # logstore がこのモジュールのモデルを import するため
+
+    logstore.add_log(db.session, user_id, message, role, mode)
+
+
+def init_db():
+    """
+    テーブル・インデックス・全文検索を作る（flask init-db から呼ぶ）。
+    既存テーブルに後から足したインデックスと、空の日別集計も作る。何度実行してもよい。
+    """
+    db.create_all()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    logsearch.install(db.engine)
+    # 集計テーブルを後から追加した場合は、既存ログから作る（モードは空になる）
+    if db.session.query(DailyActivity).first() is None and db.session.query(Log).first() is not None:
+        from core import logstore
+
+        logstore.rebuild_activity(db.session)
@@ -0,0 +1,166 @@
+import math
+import re
+import unicodedata
+from collections import Counter, namedtuple
+from functools import lru_cache
+
+# ================================
+# 気分テキストの正規化と意味的なまとめ上げ
+# ================================
+# 「かなしい」「悲しい…」「ちょっと悲しい」のような表記ゆれを同じキーにまとめ、
+# プロンプト・キャッシュ・推薦プールのヒット率を上げる。
+# 外部通信はせず、文字 n-gram ベクトルの最近傍探索だけで判定する。
+
+# 気分キー -> (プロンプトに使う代表表現, 同じ気分とみなす表現)
+VOCABULARY = {
+    "happy": ("楽しい気分", (
+        "楽しい", "たのしい", "嬉しい", "うれしい", "ワクワク", "わくわくする", "ハッピー",
+        "最高", "ご機嫌", "幸せ", "しあわせ", "テンションが高い", "何か楽しいことが起こりそう",
+    )),
+    "sad": ("悲しい気分", (
+        "悲しい", "かなしい", "哀しい", "つらい", "辛い", "さみしい", "寂しい", "切ない",
+        "せつない", "泣きたい", "落ち込んでいる", "へこんでいる", "憂鬱", "ゆううつ",
+    )),
+    "angry": ("怒っている気分", (
+        "怒っている", "怒り", "イライラ", "むかつく", "腹が立つ", "頭にくる", "不機嫌",
+    )),
+    "sleepy": ("眠い気分", (
+        "眠い", "ねむい", "眠たい", "ねむたい", "だるい", "寝不足", "ぼーっとする",
+    )),
+    "love": ("恋している気分", (
+        "恋している", "恋", "恋愛", "ドキドキ", "好きな人", "片思い", "ときめき",
+    )),
+    "tired": ("疲れている気分", (
+        "疲れた", "疲れている", "つかれた", "疲れ気味", "くたくた", "ヘトヘト", "しんどい",
+        "ちょっと疲れ気味だけど頑張る",
+    )),
+    "relax": ("リラックスしたい気分", (
+        "リラックスしたい", "のんびりしたい", "まったりしたい", "癒されたい", "ゆっくりしたい",
+        "今日はのんびり過ごしたい", "すっきりしたい",
+    )),
+    "excited": ("冒険したい気分", (
+        "冒険に出かけたい", "新しいことにチャレンジしたい", "チャレンジしたい", "やる気がある",
+        "元気", "ワクワクしたい", "出かけたい",
+    )),
+    "hungry": ("おいしいものを食べたい気分", (
+        "おいしいもの食べたい", "美味しいものが食べたい", "お腹すいた", "おなかすいた", "腹ペコ",
+    )),
+}
+
+# 強弱を表すだけの語。先頭にある場合だけ取り除き、意味の判定には使わない
+# （「超」のような1文字の語は「超えたい」も削ってしまうので含めない）
+_MODIFIERS = (
+    "ちょっと", "ちょっぴり", "すこし", "少し", "なんだか", "なんか", "とても", "すごく",
+    "めっちゃ", "かなり", "今日は", "今は", "今日", "なんとなく",
+)
+
+# 末尾の「な気分です」などを取り除く
+_SUFFIXES = ("な気分です", "の気分です", "気分です", "な気分", "の気分", "気分", "です", "だ", "かも")
+
+# この類似度未満なら既知の気分とはみなさない（かなの bigram が1つ重なる程度では一致させない）
+MATCH_THRESHOLD = 0.7
+
+# 否定（「悲しくない」「元気が出ない」「眠れず」）を含む入力は既知の気分とみなさない
+_NEGATION = re.compile(r"な(い|く|かった)|ず(?!っ)")
+
+Mood = namedtuple("Mood", ["key", "label", "score"])
+
+
+def _fold_kana(text: str) -> str:
+    """カタカナをひらがなに寄せる（長音記号などはそのまま）"""
+    return "".join(
+        chr(ord(ch) - 0x60) if "ァ" <= ch <= "ヶ" else ch
+        for ch in text
+    )
+
+
+def normalize(text: str) -> str:
+    """NFKC・かな統一・記号/絵文字/空白の除去・強弱語と語尾の除去"""
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    text = "".join(
+        ch for ch in text
+        if unicodedata.category(ch)[0] in ("L", "N") or ch == "ー"
+    )
+    text = _fold_kana(text)
+    stripped = True
+    while stripped:
+        stripped = False
+        for modifier in _MODIFIERS:
+            modifier = _fold_kana(modifier)
+            if text.startswith(modifier) and len(text) > len(modifier):
+                text = text[len(modifier):]
+                stripped = True
+    for suffix in _SUFFIXES:
+        suffix = _fold_kana(suffix)
+        if text.endswith(suffix) and len(text) > len(suffix):
+            text = text[: -len(suffix)]
+            break
+    return text
+
+
+def _vector(text: str) -> Counter:
+    """文字 unigram + bigram の出現回数"""
+    grams = Counter(text)
+    grams.update(text[i:i + 2] for i in range(len(text) - 1))
+    return grams
+
+
+def _norm(vec: Counter) -> float:
+    return math.sqrt(sum(v * v for v in vec.values()))
+
+
+def _build_index():
+    entries = []
+    inverted = {}
+    for key, (_, variants) in VOCABULARY.items():
+        for variant in variants:
+            text = normalize(variant)
+            vec = _vector(text)
+            entries.append((key, text, vec, _norm(vec)))
+            for gram in vec:
+                inverted.setdefault(gram, []).append(len(entries) - 1)
+    exact = {text: key for key, text, _, _ in entries}
+    return entries, inverted, exact
+
+
+_ENTRIES, _INVERTED, _EXACT = _build_index()
+
+
+@lru_cache(maxsize=4096)
+def canonicalize(text: str) -> Mood:
+    """
+    気分テキストを正規化し、既知の気分に最も近ければそのキーを返す。
+
+    既知の気分に当たらない場合も、正規化後の文字列を "raw:" 付きのキーとして返すので、
+    句読点や表記ゆれだけが違う入力は同じキーになる。
+    """
+    normalized = normalize(text)
+    if not normalized:
+        return Mood(None, text or "", 0.0)
+
+    if normalized in _EXACT:
+        key = _EXACT[normalized]
+        return Mood(key, VOCABULARY[key][0], 1.0)
+
+    # 「切ない」のような語彙そのものは上で一致済み。それ以外の否定は意味が逆になり得るので一致させない
+    if _NEGATION.search(normalized):
+        return Mood(f"raw:{normalized}", text.strip(), 0.0)
+
+    vec = _vector(normalized)
+    norm = _norm(vec)
+    candidates = {i for gram in vec for i in _INVERTED.get(gram, ())}
+    best_key, best_score = None, 0.0
+    for i in candidates:
+        key, _, entry_vec, entry_norm = _ENTRIES[i]
+        dot = sum(count * entry_vec.get(gram, 0) for gram, count in vec.items())
+        score = dot / (norm * entry_norm)
+        if score > best_score:
+            best_key, best_score = key, score
+
+    if best_key and best_score >= MATCH_THRESHOLD:
+        return Mood(best_key, VOCABULARY[best_key][0], round(best_score, 3))
+    return Mood(f"raw:{normalized}", text.strip(), round(best_score, 3))
+
+
+def is_known(mood: Mood) -> bool:
+    return bool(mood.key) and mood.key in VOCABULARY
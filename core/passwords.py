@@ -0,0 +1,70 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+# ================================
+# パスワードハッシュ（リクエストスレッドの外で実行）
+# ================================
+# ハッシュ計算（PBKDF2 / scrypt）は重いので、上限付きのプールで実行する。
+# hashlib は計算中に GIL を手放すため、スレッドプールでも複数コアを使える。
+# 待ち行列が一杯のときは PasswordHashBusy を投げ、呼び出し側は 503 を返す。
+
+# werkzeug の method 文字列（例: "pbkdf2:sha256:600000", "scrypt:32768:8:1"）
+HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "pbkdf2")
+
+# thread / process
+POOL_KIND = os.getenv("PASSWORD_HASH_POOL", "thread")
+POOL_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# 実行中に加えて待たせてよい件数
+QUEUE_LIMIT = int(os.getenv("PASSWORD_HASH_QUEUE", "16"))
+# 空きを待つ最大秒数
+QUEUE_WAIT = float(os.getenv("PASSWORD_HASH_WAIT", "2"))
+
+
+class PasswordHashBusy(Exception):
+    """ハッシュ計算の待ち行列が一杯"""
+
+
+_slots = threading.BoundedSemaphore(POOL_WORKERS + QUEUE_LIMIT)
+_executor = None
+_executor_lock = threading.Lock()
+_method_prefix = None
+
+
+def _get_executor():
+    # gunicorn --preload で fork した後のワーカーで初めて作る
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                pool_class = ProcessPoolExecutor if POOL_KIND == "process" else ThreadPoolExecutor
+                _executor = pool_class(max_workers=POOL_WORKERS)
+    return _executor
+
+
+def _run(fn, *args):
+    if not _slots.acquire(timeout=QUEUE_WAIT):
+        raise PasswordHashBusy("パスワード処理が混み合っています")
+    try:
+        return _get_executor().submit(fn, *args).result()
+    finally:
+        _slots.release()
+
+
+def hash_password(password: str) -> str:
+    return _run(generate_password_hash, password, HASH_METHOD)
+
+
+def verify_password(pwhash: str, password: str) -> bool:
+    return _run(check_password_hash, pwhash, password)
+
+
+def needs_rehash(pwhash: str) -> bool:
+    """保存済みハッシュの方式・コストが現在の設定と違うか"""
+    global _method_prefix
+    if _method_prefix is None:
+        # "pbkdf2" のような省略形を werkzeug が補った完全な形にそろえる（これも重いのでプールで）
+        _method_prefix = _run(generate_password_hash, "", HASH_METHOD).split("$", 1)[0]
+    return pwhash.split("$", 1)[0] != _method_prefix
@@ -0,0 +1,48 @@
+# ================================
+# 推薦プール用のキー計算
+# ================================
+# (MBTI, 天気バケット, 気分キー, モード) の組み合わせごとに、
+# あらかじめ生成・エンリッチ済みの推薦結果を貯めておく。
+# 気分キーは moods.canonicalize() が返す既知の気分のキー。
+
+MBTI_TYPES = (
+    "INTJ", "INTP", "ENTJ", "ENTP", "INFJ", "INFP", "ENFJ", "ENFP",
+    "ISTJ", "ISFJ", "ESTJ", "ESFJ", "ISTP", "ISFP", "ESTP", "ESFP",
+)
+
+MODES = ("normal", "playlist", "movie", "food")
+
+
+def mbti_key(mbti) -> str:
+    mbti = (mbti or "").upper()
+    return mbti if mbti in MBTI_TYPES else "-"
+
+
+def weather_bucket(weather, temp) -> str:
+    """天気の説明文と気温を「clear_mild」のような粗いバケットにまとめる"""
+    if not weather:
+        condition = "unknown"
+    elif "雪" in weather:
+        condition = "snow"
+    elif "雨" in weather or "雷" in weather:
+        condition = "rain"
+    elif "曇" in weather or "雲" in weather or "霧" in weather:
+        condition = "cloudy"
+    elif "晴" in weather:
+        condition = "clear"
+    else:
+        condition = "other"
+
+    if temp is None:
+        band = "na"
+    elif temp < 10:
+        band = "cold"
+    elif temp < 25:
+        band = "mild"
+    else:
+        band = "hot"
+    return f"{condition}_{band}"
+
+
+def pool_key(mbti, weather, temp, mood_key: str, mode: str) -> str:
+    return "|".join([mbti_key(mbti), weather_bucket(weather, temp), mood_key, mode])
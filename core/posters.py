@@ -0,0 +1,223 @@
+import hashlib
+import io
+import os
+import re
+import sqlite3
+import time
+
+import requests
+from flask import abort, redirect, send_file
+
+from core import assets, config, upstream
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow は任意（無ければ TMDB の画像をそのまま保存して返す）
+    Image = None
+
+# ================================
+# TMDB ポスター画像のプロキシ（ディスクキャッシュ付き）
+# ================================
+# /posters/w300/<TMDBのファイル名> で、TMDB から1回だけ取得した画像を
+# 小さな WebP のサムネイルにして返す。2回目以降は通信もリサイズもしない。
+# 画像は内容の sha256 をファイル名にして保存し（同じ画像は1つだけ）、
+# どのURLがどの画像かは SQLite の索引に持つので gunicorn の複数ワーカーで共有される。
+# 合計サイズが上限を超えたら、最近使われていない画像から削除する。
+
+# 返すサムネイルの幅（/posters/w154/... と /posters/w300/...）
+WIDTHS = (154, 300)
+# リサイズ元として TMDB から取得するサイズ（すべての幅より大きいもの）
+SOURCE_SIZE = "w342"
+WEBP_QUALITY = 80
+JPEG_QUALITY = 85
+# 最終アクセス時刻の更新はこの秒数に1回まで（ヒットのたびに書き込まない）
+TOUCH_INTERVAL = 60
+# 上限を超えたら上限のこの割合まで減らす（毎回少しずつ消さないように）
+EVICT_TARGET = 0.9
+
+# TMDB の poster_path（/abc123.jpg）のファイル名部分だけを受け付ける
+_NAME = re.compile(r"^[A-Za-z0-9_-]+\.(jpg|jpeg|png)$")
+
+
+def enabled() -> bool:
+    return os.getenv("POSTER_PROXY", "1") == "1"
+
+
+def _cache_dir() -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.getenv("POSTER_CACHE_DIR") or os.path.join(root, "instance", "posters")
+
+
+def _max_bytes() -> int:
+    return int(float(os.getenv("POSTER_CACHE_MAX_MB", "200")) * 1024 * 1024)
+
+
+def local_url(poster_path, width: int = 300):
+    """
+    TMDB の poster_path をこのサーバーのURLにする。無効なら TMDB のURLのまま。
+    POSTER_BASE_URL が空なら相対URL（プールに保存しても配信先のホストに依存しない）。
+    """
+    if not poster_path:
+        return None
+    if not enabled():
+        return upstream.url("tmdb_image", f"/t/p/w{width}{poster_path}")
+    base = os.getenv("POSTER_BASE_URL", "").rstrip("/")
+    return f"{base}/posters/w{width}{poster_path}"
+
+
+def _connect() -> sqlite3.Connection:
+    path = _cache_dir()
+    os.makedirs(path, exist_ok=True)
+    conn = sqlite3.connect(os.path.join(path, "index.db"), timeout=5, isolation_level=None)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS blobs ("
+        "hash TEXT PRIMARY KEY, size INTEGER NOT NULL, mimetype TEXT NOT NULL, last_access REAL NOT NULL)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS variants (key TEXT PRIMARY KEY, hash TEXT NOT NULL)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_blobs_last_access ON blobs (last_access)")
+    return conn
+
+
+def _blob_path(digest: str) -> str:
+    return os.path.join(_cache_dir(), digest[:2], digest)
+
+
+def _lookup(conn, key: str):
+    """キャッシュにあれば (hash, mimetype)。無ければ None"""
+    row = conn.execute(
+        "SELECT b.hash, b.mimetype, b.last_access FROM variants v JOIN blobs b ON b.hash = v.hash "
+        "WHERE v.key = ?", (key,)
+    ).fetchone()
+    if row is None:
+        return None
+    digest, mimetype, last_access = row
+    if not os.path.exists(_blob_path(digest)):
+        # ファイルだけ消されていた場合は取り直す
+        conn.execute("DELETE FROM variants WHERE hash = ?", (digest,))
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        return None
+    now = time.time()
+    if now - last_access > TOUCH_INTERVAL:
+        conn.execute("UPDATE blobs SET last_access = ? WHERE hash = ?", (now, digest))
+    return digest, mimetype
+
+
+def _store(conn, key: str, data: bytes, mimetype: str):
+    digest = hashlib.sha256(data).hexdigest()
+    path = _blob_path(digest)
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    now = time.time()
+    conn.execute(
+        "INSERT INTO blobs (hash, size, mimetype, last_access) VALUES (?, ?, ?, ?) "
+        "ON CONFLICT(hash) DO UPDATE SET last_access = excluded.last_access",
+        (digest, len(data), mimetype, now),
+    )
+    conn.execute("INSERT OR REPLACE INTO variants (key, hash) VALUES (?, ?)", (key, digest))
+    _evict(conn, keep=digest)
+    return digest, mimetype
+
+
+def _evict(conn, keep: str):
+    """合計サイズが上限を超えていれば、最終アクセスが古い画像から削除する"""
+    limit = _max_bytes()
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+    if total <= limit:
+        return
+    target = limit * EVICT_TARGET
+    rows = conn.execute("SELECT hash, size FROM blobs WHERE hash != ? ORDER BY last_access", (keep,)).fetchall()
+    for digest, size in rows:
+        if total <= target:
+            break
+        conn.execute("DELETE FROM variants WHERE hash = ?", (digest,))
+        conn.execute("DELETE FROM blobs WHERE hash = ?", (digest,))
+        try:
+            os.remove(_blob_path(digest))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def _fetch(size: str, name: str):
+    res = upstream.get("tmdb_image", f"/t/p/{size}/{name}", timeout=config.UPSTREAM_TIMEOUT)
+    res.raise_for_status()
+    mimetype = res.headers.get("Content-Type", "image/jpeg").split(";")[0].strip()
+    return res.content, mimetype
+
+
+def _source(conn, name: str) -> bytes:
+    """リサイズ元の画像。別の幅・形式を作るときに取り直さないよう、これもキャッシュする"""
+    key = f"{name}:source"
+    found = _lookup(conn, key)
+    if found:
+        with open(_blob_path(found[0]), "rb") as f:
+            return f.read()
+    data, mimetype = _fetch(SOURCE_SIZE, name)
+    _store(conn, key, data, mimetype)
+    return data
+
+
+def _thumbnail(data: bytes, width: int, fmt: str):
+    with Image.open(io.BytesIO(data)) as img:
+        if img.width > width:
+            img = img.resize((width, round(img.height * width / img.width)), Image.LANCZOS)
+        img = img.convert("RGB")
+        out = io.BytesIO()
+        if fmt == "webp":
+            img.save(out, "WEBP", quality=WEBP_QUALITY, method=6)
+        else:
+            img.save(out, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return out.getvalue(), f"image/{fmt}"
+
+
+def _build(conn, name: str, width: int, fmt: str):
+    if fmt == "original":
+        # Pillow が無いときは TMDB 側で縮小済みの画像をそのまま使う
+        return _fetch(f"w{width}", name)
+    return _thumbnail(_source(conn, name), width, fmt)
+
+
+def poster(width, name):
+    """ポスターのサムネイルを返す。URLごとに内容が変わらないので1年キャッシュさせる"""
+    if width not in WIDTHS or not _NAME.match(name):
+        abort(404)
+    if Image is None:
+        fmt = "original"
+    else:
+        fmt = "webp" if assets.accepts_webp() else "jpeg"
+    key = f"{name}:w{width}:{fmt}"
+
+    conn = _connect()
+    try:
+        found = _lookup(conn, key)
+        if found is None:
+            try:
+                data, mimetype = _build(conn, name, width, fmt)
+            except (requests.exceptions.RequestException, OSError) as e:
+                print(f"[Poster] 取得エラー: {e}")
+                # 取得できなければ TMDB の画像へ（このリダイレクトはキャッシュさせない）
+                res = redirect(upstream.url("tmdb_image", f"/t/p/w{width}/{name}"))
+                res.cache_control.no_store = True
+                return res
+            found = _store(conn, key, data, mimetype)
+    finally:
+        conn.close()
+
+    digest, mimetype = found
+    res = send_file(_blob_path(digest), mimetype=mimetype, etag=digest, max_age=assets.IMMUTABLE_MAX_AGE,
+                    conditional=True)
+    res.cache_control.public = True
+    res.cache_control.immutable = True
+    res.vary.add("Accept")
+    return res
+
+
+def init_app(app):
+    """/posters/w<幅>/<ファイル名> を登録する"""
+    if enabled():
+        app.add_url_rule("/posters/w<int:width>/<name>", "poster", poster)
+    return app
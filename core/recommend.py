@@ -0,0 +1,389 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+from core import breaker, config, moods, pools, posters, upstream
+from core.models import PoolEntry, db
+
+# ================================
+# 上流APIを使う処理（HTML版・API版で共通）
+# ================================
+
+# 映画（TMDB）の情報を返すモード
+MOVIE_MODES = ("movie", "normal")
+
+# YouTube / TMDB 検索とバッチ生成を並列に投げるスレッドプール
+_executor = None
+_executor_lock = threading.Lock()
+
+# テストモードで Gemini の記録が無いときに返すサンプル
+TEST_RESULT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                "test_data", "ai_result.json")
+
+# 都市名 -> (取得時刻, (天気, 気温))。天気は数分で変わらないのでワーカー内で使い回す
+_weather_cache = {}
+# 裏で取り直し中の都市
+_weather_refreshing = set()
+_weather_lock = threading.Lock()
+
+
+def _fetch_weather(city_name: str):
+    params = {"q": city_name, "appid": config.OPENWEATHER_API_KEY, "lang": "ja", "units": "metric"}
+    try:
+        res = upstream.get("openweather", "/data/2.5/weather", params=params,
+                           timeout=config.UPSTREAM_TIMEOUT)
+        res.raise_for_status()
+        data = res.json()
+        value = (data["weather"][0]["description"], data["main"]["temp"])
+        _weather_cache[city_name] = (time.time(), value)
+        return value
+    except upstream.CircuitOpen:
+        pass
+    except requests.exceptions.RequestException as e:
+        print(f"[OpenWeather] HTTPエラー: {e}")
+    except Exception as e:
+        print(f"[OpenWeather] 予期せぬエラー: {e}")
+    return None
+
+
+def _refresh_weather(city_name: str):
+    try:
+        _fetch_weather(city_name)
+    finally:
+        with _weather_lock:
+            _weather_refreshing.discard(city_name)
+
+
+def get_weather(city_name: str):
+    """
+    OpenWeather（現在）: 日本語 + 摂氏。取得できなければ (None, None)。
+    期限切れでも WEATHER_STALE_TTL 以内なら古い値をすぐ返し、裏で取り直す（stale-while-revalidate）。
+    上流が障害中でも WEATHER_STALE_TTL 以内ならその値を返す。それより古い値は使わない。
+    """
+    api_key = config.OPENWEATHER_API_KEY
+    if (not api_key or api_key == "YOUR_OPENWEATHER_API_KEY") and not upstream.is_replay():
+        return None, None
+    cached = _weather_cache.get(city_name)
+    age = time.time() - cached[0] if cached else None
+    if cached and age < config.WEATHER_CACHE_TTL:
+        return cached[1]
+    if cached and age < config.WEATHER_STALE_TTL:
+        with _weather_lock:
+            refresh = city_name not in _weather_refreshing and not breaker.is_open("openweather")
+            if refresh:
+                _weather_refreshing.add(city_name)
+        if refresh:
+            _get_executor().submit(contextvars.copy_context().run, _refresh_weather, city_name)
+        return cached[1]
+    # ここに来るのはキャッシュが無いか WEATHER_STALE_TTL を過ぎたとき。古すぎる天気はプロンプトに入れない
+    value = _fetch_weather(city_name)
+    return value if value is not None else (None, None)
+
+
+def cached_weather(city_name: str):
+    """
+    通信せずに、このワーカーが最後に取得した天気を返す（期限切れでも返す）。
+    (天気, 気温, 期限内か)。まだ一度も取得していなければ (None, None, False)。
+    """
+    cached = _weather_cache.get(city_name)
+    if not cached:
+        return None, None, False
+    fetched_at, (weather, temp) = cached
+    return weather, temp, time.time() - fetched_at < config.WEATHER_CACHE_TTL
+
+
+def youtube_configured() -> bool:
+    api_key = config.YOUTUBE_API_KEY
+    return (bool(api_key) and api_key != "YOUR_YOUTUBE_API_KEY") or upstream.is_replay()
+
+
+def search_youtube_first_video(query: str, user_id=None, priority: str = "enrichment"):
+    """YouTubeで最初の動画URLを返す。APIキー未設定・予算不足なら '#'. """
+    if not youtube_configured():
+        return "#"
+    api_key = config.YOUTUBE_API_KEY
+    params = {
+        "part": "snippet",
+        "q": f"{query} MV",
+        "type": "video",
+        "maxResults": 5,
+        "key": api_key,
+        "regionCode": "JP",
+        "relevanceLanguage": "ja",
+        "order": "relevance",
+    }
+    try:
+        res = upstream.get("youtube", "/youtube/v3/search", params=params, timeout=config.UPSTREAM_TIMEOUT,
+                           user_id=user_id, priority=priority)
+        res.raise_for_status()
+        data = res.json()
+        for item in data.get("items", []):
+            vid = item.get("id", {}).get("videoId")
+            if vid:
+                return f"https://www.youtube.com/watch?v={vid}"
+    except upstream.CircuitOpen:
+        pass  # 障害中はリンクを省く
+    except requests.exceptions.RequestException as e:
+        print(f"[YouTube] HTTPエラー: {e}")
+    except Exception as e:
+        print(f"[YouTube] 予期せぬエラー: {e}")
+    return "#"
+
+
+def search_movie_tmdb(title: str):
+    """TMDB検索：最初の結果を返す（日本語）。未設定なら None。"""
+    if not config.TMDB_API_KEY and not upstream.is_replay():
+        return None
+    params = {"api_key": config.TMDB_API_KEY, "query": title, "language": "ja-JP"}
+    try:
+        res = upstream.get("tmdb", "/3/search/movie", params=params, timeout=config.UPSTREAM_TIMEOUT)
+        res.raise_for_status()
+        data = res.json()
+        if data.get("results"):
+            movie = data["results"][0]
+            return {
+                "title": movie.get("title"),
+                "overview": movie.get("overview"),
+                "release_date": movie.get("release_date"),
+                # 画像はこのサーバーのプロキシ経由（2回目以降は TMDB へ通信しない）
+                "poster_path": posters.local_url(movie.get("poster_path"), 300),
+                "poster_thumb": posters.local_url(movie.get("poster_path"), 154),
+                "tmdb_url": f"https://www.themoviedb.org/movie/{movie.get('id')}",
+            }
+    except upstream.CircuitOpen:
+        pass  # 障害中は映画情報を省く
+    except requests.exceptions.RequestException as e:
+        print(f"[TMDB] HTTPエラー: {e}")
+    except Exception as e:
+        print(f"[TMDB] 予期せぬエラー: {e}")
+    return None
+
+
+def maps_configured() -> bool:
+    key = config.GOOGLE_MAPS_API_KEY.strip()
+    return (bool(key) and key != "YOUR_GOOGLE_MAPS_API_KEY") or upstream.is_replay()
+
+
+def search_restaurants(lat, lon, food: str) -> list:
+    """
+    Google Places（周辺検索）で近くのお店を返す。
+    通信エラーは呼び出し側で処理する（requests.exceptions.RequestException）。
+    """
+    params = {
+        "location": f"{lat},{lon}",
+        "radius": 1500,  # 検索半径(メートル)
+        "keyword": food,
+        "language": "ja",
+        "key": config.GOOGLE_MAPS_API_KEY.strip(),
+    }
+    res = upstream.get("maps", "/maps/api/place/nearbysearch/json", params=params, timeout=20)
+    res.raise_for_status()
+    data = res.json()
+
+    results = []
+    for place in data.get("results", []):
+        # GoogleマップのURLを構築。店名をURLエンコードする
+        map_url = (
+            "https://www.google.com/maps/search/?api=1&query="
+            f"{requests.utils.quote(place.get('name', ''))}"
+            f"&query_place_id={place.get('place_id', '')}"
+        )
+        results.append({
+            "name": place.get("name"),
+            "vicinity": place.get("vicinity"),  # 住所
+            "rating": place.get("rating", "N/A"),
+            "place_id": place.get("place_id"),
+            "url": map_url
+        })
+    return results
+
+
+# build_prompt が入れる天気の一文（フィクスチャのキーからは除く）
+_WEATHER_TEXT = re.compile(r" 現在の天気は「[^」]*」、気温は[^℃]*℃です。天気や気温も考慮して、")
+
+
+def build_prompt(mbti, weather, temp, mood: str, mode: str) -> str:
+    mbti_text = (
+        f" ユーザーのMBTIタイプは {mbti} です。MBTIの性格傾向も考慮して、"
+        if mbti and mbti.lower() != "わからない"
+        else ""
+    )
+    weather_text = (
+        f" 現在の天気は「{weather}」、気温は{temp}℃です。天気や気温も考慮して、"
+        if weather and temp is not None
+        else ""
+    )
+
+    prompts = {
+        "playlist": f"{mbti_text}{weather_text}今の気分は「{mood}」です。この気分にぴったりの日本の曲を10曲、1行ずつ「🎵 曲名 - 理由」の形式で出力してください。",
+        "movie": f"{mbti_text}{weather_text}今の気分は「{mood}」です。この気分に合う名作の海外と日本の映画を5つ、1行ずつ「🎬 映画名 - 理由」の形式で出力してください。",
+        "food": (
+            f"{mbti_text}{weather_text}今の気分は「{mood}」です。この気分に合った食の選択肢を、"
+            "料理・外食・コンビニ商品の中から5つ提案してください。それぞれ「🍽️ 食事名 - 理由 - 主な栄養素（例：たんぱく質、炭水化物、ビタミンC）」の形式で出力してください。"
+            "料理が向かない気分のときは、外食やコンビニを優先して構いません。"
+        ),
+        "normal": (
+            f"{mbti_text}{weather_text}今の気分は「{mood}」です。これに合う日本の曲を3つ、1行ずつ「🎵 曲名 - 理由」の形式で出力してください。"
+            "次に、その気分にあう日本の映画を3つ、1行ずつ「🎬 映画名 - 理由」の形式で出力してください。"
+            "最後に、今の気分にあう食事を3つ、1行ずつ「🍽️ 食事名 - 理由」の形式で出力してください。"
+        ),
+    }
+    return prompts.get(mode, prompts["normal"])
+
+
+def generate_text(prompt: str, user_id=None, priority: str = "core") -> str:
+    """Gemini で推薦テキストを生成する。通信エラーは呼び出し側で処理する"""
+    if (not config.GEMINI_MODEL_NAME or not config.GEMINI_API_KEY) and not upstream.is_replay():
+        return "（開発モード）APIキー未設定のためダミー応答：\n🎵 Pretender - 前向きになれる\n🎬 君の名は。 - 切なくも温かい\n🍽️ 親子丼 - たんぱく質・炭水化物"
+    headers = {"Content-Type": "application/json"}
+    data = {"contents": [{"parts": [{"text": prompt}]}]}
+    # 天気は記録したときと再生するときで変わるので、フィクスチャのキーには含めない
+    fixture_data = {"contents": [{"parts": [{"text": _WEATHER_TEXT.sub("", prompt)}]}]}
+    response = upstream.post(
+        "gemini", f"/v1beta/models/{config.GEMINI_MODEL_NAME}:generateContent",
+        params={"key": config.GEMINI_API_KEY}, headers=headers, json=data, timeout=config.GEMINI_TIMEOUT,
+        user_id=user_id, priority=priority, fixture_json=fixture_data,
+    )
+    response.raise_for_status()
+    result = response.json()
+    return result["candidates"][0]["content"]["parts"][0]["text"]
+
+
+def _get_executor():
+    # gunicorn --preload で fork した後のワーカーで初めて作る
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=config.UPSTREAM_FANOUT)
+    return _executor
+
+
+def _fan_out(calls: list) -> list:
+    """
+    [(fn, args), ...] を並列に実行し、同じ順で結果を返す。
+    upstream.override_mode（テストモード）が効くよう contextvars も引き継ぐ。
+    プールの中からさらに _fan_out を呼ばないこと（ワーカーを使い切って止まる）。
+    """
+    if len(calls) <= 1:
+        return [fn(*args) for fn, args in calls]
+    futures = [_get_executor().submit(contextvars.copy_context().run, fn, *args) for fn, args in calls]
+    return [f.result() for f in futures]
+
+
+def _extract(raw_text: str):
+    song_lines = re.findall(r"🎵\s*(.+?)\s*-", raw_text)
+    movie_titles = re.findall(r"🎬\s*(.+?)\s*-\s*.+", raw_text)
+    return song_lines, movie_titles
+
+
+def _assemble(raw_text: str, mode: str, song_links: dict, movie_infos: dict) -> dict:
+    # --- YouTubeリンク埋め込み ---
+    enriched_text = raw_text
+    song_lines, movie_titles = _extract(raw_text)
+    for song in song_lines:
+        enriched_text = re.sub(
+            rf"(🎵\s*){re.escape(song)}(\s*-)",
+            "\\1<a href='" + song_links[song] + "' target='_blank' rel='noopener' class='text-blue-400 underline'>" + song + "</a>\\2",
+            enriched_text,
+            count=1,
+        )
+
+    # --- 食事抽出 ---
+    food_titles = re.findall(r"🍽️\s*(.+?)\s*-", enriched_text)
+
+    return {
+        "raw_text": raw_text,
+        "reply": enriched_text,
+        "songs": [{"title": s, "youtube": song_links[s]} for s in song_lines],
+        "foods": [{"name": f} for f in food_titles],
+        "movies": [movie_infos[t] for t in movie_titles if movie_infos.get(t)] if mode in MOVIE_MODES else [],
+    }
+
+
+def enrich_many(items: list, user_id=None, priority: str = "core") -> list:
+    """
+    [(生成テキスト, モード), ...] に YouTube / TMDB の情報を付与する。
+    全件の曲・映画を重複なくまとめ、1回の fan-out で並列に検索する。
+    """
+    song_priority = {}
+    movie_titles = []
+    for raw_text, mode in items:
+        songs, titles = _extract(raw_text)
+        for i, song in enumerate(songs):
+            # 予算が少ないときは各結果の先頭の数曲だけリンクを付け、残りは省く
+            if priority == "core" and i < config.YOUTUBE_CORE_LINKS:
+                song_priority[song] = "core"
+            else:
+                song_priority.setdefault(song, "enrichment")
+        if mode in MOVIE_MODES:
+            movie_titles += [t for t in titles if t not in movie_titles]
+
+    songs = list(song_priority)
+    found = _fan_out(
+        [(search_youtube_first_video, (song, user_id, song_priority[song])) for song in songs]
+        + [(search_movie_tmdb, (title,)) for title in movie_titles]
+    )
+    song_links = dict(zip(songs, found[:len(songs)]))
+    movie_infos = dict(zip(movie_titles, found[len(songs):]))
+    return [_assemble(raw_text, mode, song_links, movie_infos) for raw_text, mode in items]
+
+
+def generate_recommendation(prompt: str, mode: str, user_id=None, priority: str = "core") -> dict:
+    """
+    Gemini で生成し、YouTube / TMDB で情報を付与する。
+    通信エラーは呼び出し側で処理する（upstream.QuotaExceeded / RequestException など）。
+    """
+    raw_text = generate_text(prompt, user_id=user_id, priority=priority)
+    return enrich_many([(raw_text, mode)], user_id=user_id, priority=priority)[0]
+
+
+def generate_batch(prompts: list, user_id=None, priority: str = "core") -> list:
+    """
+    [(プロンプト, モード), ...] を並列に生成し、情報の付与は全件まとめて行う。
+    prompts と同じ順で (結果, None) または生成に失敗したものは (None, 例外) を返す。
+    """
+    def attempt(prompt):
+        try:
+            return generate_text(prompt, user_id=user_id, priority=priority), None
+        except Exception as e:
+            return None, e
+
+    texts = _fan_out([(attempt, (prompt,)) for prompt, _ in prompts])
+    ok = [(text, mode) for (text, error), (_, mode) in zip(texts, prompts) if error is None]
+    enriched = iter(enrich_many(ok, user_id=user_id, priority=priority))
+    return [(None, error) if error is not None else (next(enriched), None) for _, error in texts]
+
+
+def test_result() -> dict:
+    """テストモードで Gemini のフィクスチャが無いときの結果（test_data/ai_result.json）"""
+    with open(TEST_RESULT_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {"raw_text": data["reply"], **response_payload(data)}
+
+
+def response_payload(result: dict) -> dict:
+    return {k: result[k] for k in ("reply", "songs", "foods", "movies")}
+
+
+# ================================
+# 推薦プール（事前生成）
+# ================================
+def sample_pool_entry(mbti, weather, temp, mood: moods.Mood, mode: str):
+    """プールに該当があればランダムに1件返す。無ければ None（ライブ生成へ）"""
+    if not moods.is_known(mood) or mode not in pools.MODES:
+        return None
+    key = pools.pool_key(mbti, weather, temp, mood.key, mode)
+    cutoff = datetime.utcnow() - timedelta(hours=config.RECO_POOL_TTL_HOURS)
+    return (
+        PoolEntry.query.filter(PoolEntry.pool_key == key, PoolEntry.created_at >= cutoff)
+        .order_by(db.func.random())
+        .first()
+    )
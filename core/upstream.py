@@ -0,0 +1,188 @@
+import os
+import json
+import time
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+import requests
+
+from core import breaker, config, governor
+
+# ================================
+# 上流API（外部サービス）のレジストリ
+# ================================
+# 名前 -> (ベースURLを上書きする環境変数, 既定のベースURL)
+# ローカルのキャッシュプロキシや地域ミラーを使う場合は環境変数で差し替える
+UPSTREAMS = {
+    "gemini": ("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com"),
+    "youtube": ("YOUTUBE_BASE_URL", "https://www.googleapis.com"),
+    "tmdb": ("TMDB_BASE_URL", "https://api.themoviedb.org"),
+    "tmdb_image": ("TMDB_IMAGE_BASE_URL", "https://image.tmdb.org"),
+    "openweather": ("OPENWEATHER_BASE_URL", "http://api.openweathermap.org"),
+    "maps": ("GOOGLE_MAPS_BASE_URL", "https://maps.googleapis.com"),
+}
+
+# live: 通常通り通信 / record: 通信しつつ応答をフィクスチャに保存 / replay: フィクスチャのみで応答
+MODES = ("live", "record", "replay")
+
+# フィクスチャのキーに含めないパラメータ（APIキー類）
+SECRET_PARAMS = {"key", "api_key", "appid"}
+
+_mode_override = ContextVar("upstream_mode_override", default=None)
+
+
+class FixtureNotFound(requests.exceptions.ConnectionError):
+    """replay モードで該当するフィクスチャが存在しない"""
+
+
+class QuotaExceeded(requests.exceptions.RequestException):
+    """クォータ/レート制御により送信しなかった"""
+
+
+class CircuitOpen(requests.exceptions.ConnectionError):
+    """上流が障害中（ブレーカーが open）のため送信しなかった"""
+
+
+def base_url(name: str) -> str:
+    env_name, default = UPSTREAMS[name]
+    return (os.getenv(env_name) or default).rstrip("/")
+
+
+def url(name: str, path: str) -> str:
+    return f"{base_url(name)}{path}"
+
+
+def current_mode() -> str:
+    mode = _mode_override.get() or os.getenv("UPSTREAM_MODE", "live")
+    return mode if mode in MODES else "live"
+
+
+def is_replay() -> bool:
+    """replay 中は APIキー未設定でもフィクスチャから応答できる"""
+    return current_mode() == "replay"
+
+
+@contextmanager
+def override_mode(mode: str):
+    """このコンテキスト内（リクエスト単位）だけモードを切り替える"""
+    token = _mode_override.set(mode)
+    try:
+        yield
+    finally:
+        _mode_override.reset(token)
+
+
+def fixture_dir() -> str:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.getenv("UPSTREAM_FIXTURE_DIR") or os.path.join(root, "test_data", "fixtures")
+
+
+def fixture_key(name: str, method: str, path: str, params=None, json_body=None) -> str:
+    """APIキーを除いたリクエスト内容から決定的なキーを作る"""
+    clean_params = {k: v for k, v in (params or {}).items() if k not in SECRET_PARAMS}
+    material = json.dumps(
+        [name, method.upper(), path, clean_params, json_body],
+        ensure_ascii=False, sort_keys=True, default=str,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _fixture_path(name: str, key: str) -> str:
+    return os.path.join(fixture_dir(), name, f"{key}.json")
+
+
+def _save_fixture(name, method, path, params, json_body, res: requests.Response):
+    key = fixture_key(name, method, path, params, json_body)
+    file_path = _fixture_path(name, key)
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    record = {
+        "request": {
+            "method": method.upper(),
+            "path": path,
+            "params": {k: v for k, v in (params or {}).items() if k not in SECRET_PARAMS},
+            "json": json_body,
+        },
+        "status": res.status_code,
+        "content_type": res.headers.get("Content-Type", "application/json"),
+        "body": res.text,
+    }
+    tmp_path = f"{file_path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(record, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, file_path)
+
+
+def _load_fixture(name, method, path, params, json_body) -> requests.Response:
+    key = fixture_key(name, method, path, params, json_body)
+    file_path = _fixture_path(name, key)
+    try:
+        with open(file_path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except FileNotFoundError:
+        raise FixtureNotFound(f"[{name}] フィクスチャがありません: {method.upper()} {path} ({key[:12]})")
+
+    res = requests.Response()
+    res.status_code = record["status"]
+    res.headers["Content-Type"] = record.get("content_type", "application/json")
+    res.encoding = "utf-8"
+    res._content = record["body"].encode("utf-8")
+    res.url = url(name, path)
+    return res
+
+
+def request(name: str, method: str, path: str, params=None, json=None,
+            user_id=None, priority: str = "core", fixture_json=None, **kwargs) -> requests.Response:
+    """
+    上流APIへのリクエスト。モードに応じて記録・再生する。
+    fixture_json を渡すと、フィクスチャのキーには json の代わりにそれを使う
+    （毎回変わる部分を除いて、記録した応答が再生時にも一致するようにする）。
+
+    実際に通信する場合は governor の予算を user_id / priority 単位で消費する。
+    上流のブレーカーが open の間は通信せずに CircuitOpen を投げる。
+    timeout を省略した場合は UPSTREAM_TIMEOUT 秒。
+    """
+    mode = current_mode()
+    key_json = json if fixture_json is None else fixture_json
+    if mode == "replay":
+        return _load_fixture(name, method, path, params, key_json)
+
+    allowed, probe = breaker.acquire(name)
+    if not allowed:
+        raise CircuitOpen(f"[{name}] 障害中のため送信を見送りました")
+    recorded = False
+    try:
+        if not governor.acquire(name, user_id=user_id, priority=priority):
+            raise QuotaExceeded(f"[{name}] 予算不足のため送信を見送りました（priority={priority}）")
+
+        kwargs.setdefault("timeout", config.UPSTREAM_TIMEOUT)
+        started = time.monotonic()
+        try:
+            res = requests.request(method, url(name, path), params=params, json=json, **kwargs)
+        except requests.exceptions.RequestException:
+            recorded = True
+            breaker.record(name, False, time.monotonic() - started, probe)
+            raise
+        # 4xx はリクエスト側の問題なので障害に数えない（429 は上流の混雑として数える）
+        recorded = True
+        breaker.record(name, res.status_code < 500 and res.status_code != 429, time.monotonic() - started, probe)
+    finally:
+        if not recorded:
+            # 送信しなかった・結果が分からない（予算不足、governor の DB エラーなど）。
+            # half_open の試行枠を返さないと、このワーカーではこの上流へ二度と送信しなくなる
+            breaker.release(name, probe)
+    # 画像などのバイナリはフィクスチャ（テキスト）にしない
+    if mode == "record" and res.status_code < 500 and not res.headers.get("Content-Type", "").startswith("image/"):
+        try:
+            _save_fixture(name, method, path, params, key_json, res)
+        except OSError as e:
+            print(f"[upstream] フィクスチャ保存エラー: {e}")
+    return res
+
+
+def get(name: str, path: str, **kwargs) -> requests.Response:
+    return request(name, "GET", path, **kwargs)
+
+
+def post(name: str, path: str, **kwargs) -> requests.Response:
+    return request(name, "POST", path, **kwargs)
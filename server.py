@@ -1,16 +1,13 @@
 import os
+import io
+import csv
 import json
-import re
+import zlib
 from datetime import datetime, timedelta
-from collections import defaultdict
 
 import requests
-from dotenv import load_dotenv
 
-from flask import Flask, request, jsonify
-from flask_sqlalchemy import SQLAlchemy
-
-from werkzeug.security import generate_password_hash, check_password_hash
+from flask import Response, request, jsonify, stream_with_context
 
 from flask_jwt_extended import (
     JWTManager, create_access_token, jwt_required, get_jwt_identity, get_jwt
@@ -18,25 +15,13 @@ from flask_jwt_extended import (
 
 from flask_cors import CORS
 
-# ================================
-# 環境変数
-# ================================
-load_dotenv()
-
-GEMINI_MODEL_NAME = os.getenv("GEMINI_MODEL_NAME", "")
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
-YOUTUBE_API_KEY = os.getenv("YOUTUBE_API_KEY", "")
-GOOGLE_MAPS_API_KEY = os.getenv("GOOGLE_MAPS_API_KEY", "")
-OPENWEATHER_API_KEY = os.getenv("OPENWEATHER_API_KEY", "")
-TMDB_API_KEY = os.getenv("TMDB_API_KEY", "")
+from core import create_app, breaker, config, governor, logsearch, logstore, moods, passwords, recommend, upstream
+from core.models import DailyActivity, Log, User, db, init_db, insert_log
 
 # ================================
 # Flask アプリ & 設定
 # ================================
-app = Flask(__name__)
-app.config["SECRET_KEY"] = os.getenv("SECRET_KEY", "your_secret_key")
-app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", "sqlite:///app.db")
-app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+app = create_app(__name__)
 
 # JWT
 app.config["JWT_SECRET_KEY"] = os.getenv("JWT_SECRET_KEY", "your_jwt_secret")
@@ -46,126 +31,8 @@ app.config["JWT_ACCESS_TOKEN_EXPIRES"] = timedelta(hours=12)
 # CORS（フロントが別オリジンの場合）
 CORS(app, resources={r"/api/*": {"origins": "*"}})
 
-db = SQLAlchemy(app)
 jwt = JWTManager(app)
 
-# ================================
-# モデル定義
-# ================================
-class User(db.Model):
-    __tablename__ = "user"
-    id = db.Column(db.Integer, primary_key=True)
-    username = db.Column(db.String(150), nullable=False)
-    email = db.Column(db.String(150), unique=True, nullable=False, index=True)
-    password_hash = db.Column(db.String(150), nullable=False)
-    mbti_type = db.Column(db.String(4), nullable=True)
-    city = db.Column(db.String(50), nullable=True)
-
-    def set_password(self, password: str):
-        self.password_hash = generate_password_hash(password)
-
-    def check_password(self, password: str) -> bool:
-        return check_password_hash(self.password_hash, password)
-
-
-class Log(db.Model):
-    __tablename__ = "logs"
-    id = db.Column(db.Integer, primary_key=True)
-    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False, index=True)
-    message = db.Column(db.Text, nullable=False)
-    role = db.Column(db.String(20), nullable=False)  # "user" or "assistant"
-    timestamp = db.Column(db.DateTime, default=datetime.utcnow)
-    user = db.relationship("User", backref="logs")
-
-
-# 初期化
-with app.app_context():
-    db.create_all()
-
-# ================================
-# ユーティリティ
-# ================================
-def insert_log(user_id: int, message: str, role: str):
-    log = Log(user_id=user_id, message=message, role=role)
-    db.session.add(log)
-    db.session.commit()
-
-def get_logs(user_id: int):
-    return Log.query.filter_by(user_id=user_id).order_by(Log.timestamp.desc()).all()
-
-def get_weather(city_name: str, api_key: str):
-    """OpenWeather（現在）: 日本語 + 摂氏"""
-    if not api_key or api_key == "YOUR_OPENWEATHER_API_KEY":
-        return None, None
-    url = "http://api.openweathermap.org/data/2.5/weather"
-    params = {"q": city_name, "appid": api_key, "lang": "ja", "units": "metric"}
-    try:
-        res = requests.get(url, params=params, timeout=15)
-        res.raise_for_status()
-        data = res.json()
-        return data["weather"][0]["description"], data["main"]["temp"]
-    except requests.exceptions.RequestException as e:
-        print(f"[OpenWeather] HTTPエラー: {e}")
-    except Exception as e:
-        print(f"[OpenWeather] 予期せぬエラー: {e}")
-    return None, None
-
-def search_youtube_first_video(query: str):
-    """YouTubeで最初の動画URLを返す。APIキー未設定なら '#'. """
-    if not YOUTUBE_API_KEY or YOUTUBE_API_KEY == "YOUR_YOUTUBE_API_KEY":
-        return "#"
-    url = "https://www.googleapis.com/youtube/v3/search"
-    params = {
-        "part": "snippet",
-        "q": f"{query} MV",
-        "type": "video",
-        "maxResults": 5,
-        "key": YOUTUBE_API_KEY,
-        "regionCode": "JP",
-        "relevanceLanguage": "ja",
-        "order": "relevance",
-    }
-    try:
-        res = requests.get(url, params=params, timeout=15)
-        res.raise_for_status()
-        data = res.json()
-        for item in data.get("items", []):
-            vid = item.get("id", {}).get("videoId")
-            if vid:
-                return f"https://www.youtube.com/watch?v={vid}"
-    except requests.exceptions.RequestException as e:
-        print(f"[YouTube] HTTPエラー: {e}")
-    except Exception as e:
-        print(f"[YouTube] 予期せぬエラー: {e}")
-    return "#"
-
-def search_movie_tmdb(title: str):
-    """TMDB検索：最初の結果を返す（日本語）。未設定なら None。"""
-    if not TMDB_API_KEY:
-        return None
-    url = "https://api.themoviedb.org/3/search/movie"
-    params = {"api_key": TMDB_API_KEY, "query": title, "language": "ja-JP"}
-    try:
-        res = requests.get(url, params=params, timeout=15)
-        res.raise_for_status()
-        data = res.json()
-        if data.get("results"):
-            movie = data["results"][0]
-            return {
-                "title": movie.get("title"),
-                "overview": movie.get("overview"),
-                "release_date": movie.get("release_date"),
-                "poster_path": f"https://image.tmdb.org/t/p/w300{movie.get('poster_path')}"
-                if movie.get("poster_path")
-                else None,
-                "tmdb_url": f"https://www.themoviedb.org/movie/{movie.get('id')}",
-            }
-    except requests.exceptions.RequestException as e:
-        print(f"[TMDB] HTTPエラー: {e}")
-    except Exception as e:
-        print(f"[TMDB] 予期せぬエラー: {e}")
-    return None
-
 # ================================
 # API エンドポイント
 # ================================
@@ -175,7 +42,14 @@ def index():
 
 @app.route("/api/health", methods=["GET"])
 def health():
-    return jsonify({"status": "ok", "time": datetime.utcnow().isoformat()})
+    breakers = breaker.snapshot()
+    return jsonify({
+        # 上流のどれかが障害中（ブレーカーが open）なら degraded（応答自体は縮退して続ける）
+        "status": "degraded" if any(b["state"] != "closed" for b in breakers.values()) else "ok",
+        "time": datetime.utcnow().isoformat(),
+        "upstream_budget": governor.snapshot(),
+        "upstream_breakers": breakers,
+    })
 
 # --------------- 認証 ---------------
 @app.route("/api/register", methods=["POST"])
@@ -213,6 +87,7 @@ def api_login():
     user = User.query.filter_by(email=email).first()
     if not user or not user.check_password(password):
         return jsonify({"error": "メールアドレスまたはパスワードが間違っています"}), 401
+    db.session.commit()  # 再ハッシュした場合の保存
 
     token = create_access_token(
         identity=str(user.id),
@@ -280,10 +155,14 @@ def api_profile():
 @app.route("/api/home", methods=["GET"])
 @jwt_required()
 def api_home():
-    identity = get_jwt_identity()
-    city = identity.get("city") or "Tokyo"
-    weather, temp = get_weather(city, OPENWEATHER_API_KEY)
-    return jsonify({"city": city, "weather": weather, "temp": temp})
+    city = get_jwt().get("city") or "Tokyo"
+    weather, temp = recommend.get_weather(city)
+    res = jsonify({"city": city, "weather": weather, "temp": temp})
+    # 天気が変わらなければ If-None-Match に 304 を返す
+    res.add_etag()
+    res.cache_control.private = True
+    res.cache_control.max_age = 60
+    return res.make_conditional(request)
 
 # --------------- AI 推薦 ---------------
 @app.route("/api/ai", methods=["POST"])
@@ -296,109 +175,149 @@ def api_ai():
     mood = payload.get("mood", "")
     mode = payload.get("mode", "normal")
 
-    # ✅ テストモード
+    # ✅ テストモード：記録済みフィクスチャだけで応答（通信なし）
     if payload.get("test") is True:
-        test_file_path = os.path.join("test_data", "ai_result.json")
-        try:
-            with open(test_file_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-            # ログ記録
-            insert_log(user_id, f"[TEST] {mood}", "user")
-            return jsonify(data)
-        except Exception as e:
-            return jsonify({"error": f"テストデータの読み込みに失敗しました: {e}"}), 500
+        with upstream.override_mode("replay"):
+            return _recommend(user_id, f"[TEST] {mood}", mood, mode, use_pool=False, test=True)
+
+    # "pool": false で事前生成プールを使わず必ずライブ生成する
+    return _recommend(user_id, mood, mood, mode, use_pool=payload.get("pool", True) is not False)
 
+
+def _context():
+    """推薦に使うユーザー情報と天気（claims から取得し、天気は1回だけ引く）"""
     # その他の属性は get_jwt() で claims として取得
     claims = get_jwt()
     mbti = claims.get("mbti_type")
     city = claims.get("city") or "Tokyo"
+    weather, temp = recommend.get_weather(city)
+    return mbti, weather, temp
 
 
-    weather, temp = get_weather(city, OPENWEATHER_API_KEY)
+def _ai_error(e: Exception):
+    """生成時の例外を (HTTPステータス, エラーメッセージ) にする"""
+    if isinstance(e, upstream.QuotaExceeded):
+        return 429, f"混雑のため現在AIを利用できません。しばらくしてから再度お試しください: {e}"
+    if isinstance(e, upstream.CircuitOpen):
+        return 503, f"AIが一時的に利用できません。しばらくしてから再度お試しください: {e}"
+    if isinstance(e, (requests.exceptions.RequestException, KeyError, IndexError)):
+        return 502, f"AI通信エラー: {e}"
+    return 500, f"AI応答処理中の予期せぬエラー: {e}"
 
-    mbti_text = (
-        f" ユーザーのMBTIタイプは {mbti} です。MBTIの性格傾向も考慮して、"
-        if mbti and mbti.lower() != "わからない"
-        else ""
-    )
-    weather_text = (
-        f" 現在の天気は「{weather}」、気温は{temp}℃です。天気や気温も考慮して、"
-        if weather and temp is not None
-        else ""
-    )
 
-    prompts = {
-        "playlist": f"{mbti_text}{weather_text}今の気分は「{mood}」です。この気分にぴったりの日本の曲を10曲、1行ずつ「🎵 曲名 - 理由」の形式で出力してください。",
-        "movie": f"{mbti_text}{weather_text}今の気分は「{mood}」です。この気分に合う名作の海外と日本の映画を5つ、1行ずつ「🎬 映画名 - 理由」の形式で出力してください。",
-        "food": (
-            f"{mbti_text}{weather_text}今の気分は「{mood}」です。この気分に合った食の選択肢を、"
-            "料理・外食・コンビニ商品の中から5つ提案してください。それぞれ「🍽️ 食事名 - 理由 - 主な栄養素（例：たんぱく質、炭水化物、ビタミンC）」の形式で出力してください。"
-            "料理が向かない気分のときは、外食やコンビニを優先して構いません。"
-        ),
-        "normal": (
-            f"{mbti_text}{weather_text}今の気分は「{mood}」です。これに合う日本の曲を3つ、1行ずつ「🎵 曲名 - 理由」の形式で出力してください。"
-            "次に、その気分にあう日本の映画を3つ、1行ずつ「🎬 映画名 - 理由」の形式で出力してください。"
-            "最後に、今の気分にあう食事を3つ、1行ずつ「🍽️ 食事名 - 理由」の形式で出力してください。"
-        ),
-    }
-    prompt = prompts.get(mode, prompts["normal"])
+def _recommend(user_id: int, log_message: str, mood: str, mode: str, use_pool: bool = True, test: bool = False):
+    mbti, weather, temp = _context()
 
-    # ログ記録（入力）
-    insert_log(user_id, mood, "user")
+    # 表記ゆれを吸収した気分（プールの検索キーに使う）
+    canonical = moods.canonicalize(mood)
 
-    # --- Gemini 呼び出し ---
-    raw_text = ""
-    if not GEMINI_MODEL_NAME or not GEMINI_API_KEY:
-        raw_text = "（開発モード）APIキー未設定のためダミー応答：\n🎵 Pretender - 前向きになれる\n🎬 君の名は。 - 切なくも温かい\n🍽️ 親子丼 - たんぱく質・炭水化物"
-    else:
-        GEMINI_URL = f"https://generativelanguage.googleapis.com/v1beta/models/{GEMINI_MODEL_NAME}:generateContent?key={GEMINI_API_KEY}"
-        headers = {"Content-Type": "application/json"}
-        data = {"contents": [{"parts": [{"text": prompt}]}]}
+    # --- 事前生成プールにあればそこから返す ---
+    if use_pool and config.RECO_POOL_ENABLED:
+        entry = recommend.sample_pool_entry(mbti, weather, temp, canonical, mode)
+        if entry:
+            insert_log(user_id, log_message, "user", mode)
+            insert_log(user_id, entry.raw_text, "assistant")
+            # 保存済みの JSON をそのまま返す（デコード・再エンコードしない）
+            return app.response_class(entry.payload, mimetype="application/json")
 
-        try:
-            response = requests.post(GEMINI_URL, headers=headers, json=data, timeout=30)
-            response.raise_for_status()
-            result = response.json()
-            raw_text = result["candidates"][0]["content"]["parts"][0]["text"]
-        except (requests.exceptions.RequestException, KeyError, IndexError) as e:
-            err = f"AI通信エラー: {e}"
-            insert_log(user_id, err, "assistant")
-            return jsonify({"error": err, "reply": "", "movies": []}), 502
-        except Exception as e:
-            err = f"AI応答処理中の予期せぬエラー: {e}"
+    # プロンプトにはユーザーの言葉をそのまま使う（正規化した気分はプールの検索だけに使う）
+    prompt = recommend.build_prompt(mbti, weather, temp, mood, mode)
+
+    # ログ記録（入力）
+    insert_log(user_id, log_message, "user", mode)
+
+    try:
+        result = recommend.generate_recommendation(prompt, mode, user_id=user_id)
+    except Exception as e:
+        if not (test and isinstance(e, upstream.FixtureNotFound)):
+            status, err = _ai_error(e)
             insert_log(user_id, err, "assistant")
-            return jsonify({"error": err, "reply": "", "movies": []}), 500
-
-    # --- YouTubeリンク埋め込み ---
-    enriched_text = raw_text
-    song_lines = re.findall(r"🎵\s*(.+?)\s*-", raw_text)
-    for song in song_lines:
-        url = search_youtube_first_video(song)
-        enriched_text = re.sub(
-            rf"(🎵\s*){re.escape(song)}(\s*-)","\\1<a href='"+url+"' target='_blank' rel='noopener'>"+song+"</a>\\2",
-            enriched_text,
-            count=1,
-        )
+            return jsonify({"error": err, "reply": "", "movies": []}), status
+        # テストモードで記録済みの応答が無ければ、同梱のサンプルを返す
+        result = recommend.test_result()
 
-    # --- 食事抽出 ---
-    food_titles = re.findall(r"🍽️\s*(.+?)\s*-", enriched_text)
+    # ログ記録（AI生テキスト）
+    insert_log(user_id, result["raw_text"], "assistant")
 
-    # --- 映画 ---
-    def extract_movie_titles(text: str):
-        return re.findall(r"🎬\s*(.+?)\s*-\s*.+", text)
+    return jsonify(recommend.response_payload(result))
 
-    movie_titles = extract_movie_titles(raw_text)
-    movie_infos = [info for title in movie_titles if (info := search_movie_tmdb(title))]
 
-    # ログ記録（AI生テキスト）
-    insert_log(user_id, raw_text, "assistant")
+@app.route("/api/ai/batch", methods=["POST"])
+@jwt_required()
+def api_ai_batch():
+    """
+    複数のモード（または気分）をまとめて推薦する。
+    例: {"mood": "疲れた", "modes": ["playlist", "movie", "food"]} / {"moods": ["眠い", "楽しい"], "mode": "normal"}
+    """
+    user_id = int(get_jwt_identity())
+    payload = request.get_json(silent=True) or {}
+    # 文字列を渡されると1文字ずつに分解されてしまうので、配列以外は受け付けない
+    for name in ("moods", "modes"):
+        if name in payload and not isinstance(payload[name], list):
+            return jsonify({"error": "moods / modes は文字列の配列で指定してください"}), 400
+    mood_list = payload.get("moods") or [payload.get("mood", "")]
+    mode_list = payload.get("modes") or [payload.get("mode", "normal")]
+    if not all(isinstance(v, str) for v in [*mood_list, *mode_list]):
+        return jsonify({"error": "moods / modes は文字列の配列で指定してください"}), 400
+
+    items = list(dict.fromkeys((mood, mode) for mood in mood_list for mode in mode_list))
+    if len(items) > config.BATCH_MAX_ITEMS:
+        return jsonify({"error": f"一度に指定できる組み合わせは {config.BATCH_MAX_ITEMS} 件までです"}), 400
 
-    return jsonify({
-        "reply": enriched_text,
-        "songs": [{"title": s, "youtube": search_youtube_first_video(s)} for s in song_lines],
-        "foods": [{"name": f} for f in food_titles],
-        "movies": movie_infos if mode in ["movie", "normal"] else [],
+    if payload.get("test") is True:
+        with upstream.override_mode("replay"):
+            return _recommend_batch(user_id, items, use_pool=False, test=True)
+    return _recommend_batch(user_id, items, use_pool=payload.get("pool", True) is not False)
+
+
+def _recommend_batch(user_id: int, items: list, use_pool: bool = True, test: bool = False):
+    """
+    天気・ユーザー情報は1回だけ取得して全件で共有し、プールに無いものだけを並列に生成する。
+    YouTube / TMDB の検索は全件まとめて1回の fan-out で行う。
+    """
+    mbti, weather, temp = _context()
+
+    results = [None] * len(items)
+    logs = [None] * len(items)
+    live = []
+    for i, (mood, mode) in enumerate(items):
+        canonical = moods.canonicalize(mood)
+        entry = None
+        if use_pool and config.RECO_POOL_ENABLED:
+            entry = recommend.sample_pool_entry(mbti, weather, temp, canonical, mode)
+        if entry:
+            results[i] = json.loads(entry.payload)
+            logs[i] = entry.raw_text
+        else:
+            live.append((i, recommend.build_prompt(mbti, weather, temp, mood, mode)))
+
+    generated = recommend.generate_batch([(prompt, items[i][1]) for i, prompt in live], user_id=user_id)
+    for (i, _), (result, error) in zip(live, generated):
+        if test and isinstance(error, upstream.FixtureNotFound):
+            # テストモードで記録済みの応答が無ければ、同梱のサンプルを返す
+            result, error = recommend.test_result(), None
+        if error is not None:
+            status, err = _ai_error(error)
+            results[i] = {"error": err, "status": status, "reply": "", "movies": []}
+            logs[i] = err
+        else:
+            results[i] = recommend.response_payload(result)
+            logs[i] = result["raw_text"]
+
+    # ログは (入力, 応答) の組で記録する
+    for (mood, mode), reply in zip(items, logs):
+        insert_log(user_id, f"[TEST] {mood}" if test else mood, "user", mode)
+        insert_log(user_id, reply, "assistant")
+
+    res = jsonify({
+        "weather": weather,
+        "temp": temp,
+        "results": [{"mood": mood, "mode": mode, **result} for (mood, mode), result in zip(items, results)],
     })
+    # すべて失敗した場合だけエラーのステータスを返す
+    if results and all("error" in r for r in results):
+        res.status_code = results[0]["status"]
+    return res
 
 # --------------- レストラン検索 ---------------
 
@@ -412,36 +331,11 @@ def api_find_restaurants():
     if not all([lat, lon, food]):
         return jsonify({"error": "lat, lon, food は必須です"}), 400
 
-    if not GOOGLE_MAPS_API_KEY or GOOGLE_MAPS_API_KEY.strip() == "YOUR_GOOGLE_MAPS_API_KEY":
+    if not recommend.maps_configured():
         return jsonify({"error": "Google Maps APIキーが設定されていません"}), 500
 
-    url = "https://maps.googleapis.com/maps/api/place/nearbysearch/json"
-    params = {
-        "location": f"{lat},{lon}",
-        "radius": 1500,
-        "keyword": food,
-        "language": "ja",
-        "key": GOOGLE_MAPS_API_KEY.strip(),
-    }
     try:
-        res = requests.get(url, params=params, timeout=20)
-        res.raise_for_status()
-        data = res.json()
-
-        results = []
-        for place in data.get("results", []):
-            map_url = (
-                "https://www.google.com/maps/search/?api=1&query="
-                f"{requests.utils.quote(place.get('name', ''))}"
-                f"&query_place_id={place.get('place_id', '')}"
-            )
-            results.append({
-                "name": place.get("name"),
-                "vicinity": place.get("vicinity"),
-                "rating": place.get("rating", "N/A"),
-                "place_id": place.get("place_id"),
-                "url": map_url
-            })
+        results = recommend.search_restaurants(lat, lon, food)
         return jsonify({"restaurants": results})
     except requests.exceptions.RequestException as e:
         return jsonify({"error": f"レストラン検索APIエラー: {e}"}), 502
@@ -453,8 +347,7 @@ def api_find_restaurants():
 @app.route("/api/logs", methods=["GET"])
 @jwt_required()
 def api_logs():
-    identity = get_jwt_identity()
-    user_id = identity["id"]
+    user_id = int(get_jwt_identity())
 
     # ?date=YYYY-MM-DD を指定するとその日のみ
     selected_date = request.args.get("date")
@@ -476,20 +369,178 @@ def api_logs():
         } for l in logs
     ])
 
+def _parse_date_arg(name: str, source=None):
+    """?from= / ?to= などを YYYY-MM-DD または ISO 8601 として解釈する"""
+    source = request.args if source is None else source
+    try:
+        return logstore.parse_date(source.get(name))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} は YYYY-MM-DD または ISO 8601 形式で指定してください")
+
+# 何行ずつDBから取り出して書き出すか
+EXPORT_BATCH_SIZE = 500
+
+@app.route("/api/logs/export", methods=["GET"])
+@jwt_required()
+def api_logs_export():
+    """
+    ログ全件を NDJSON / CSV でストリーミング出力する。
+
+    ?format=ndjson|csv, ?from=, ?to=（日付のみなら当日を含む）, ?gzip=1
+    サーバー側カーソル（yield_per）で少しずつ読むので、履歴の量に関係なくメモリは一定。
+    """
+    user_id = int(get_jwt_identity())
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in ("ndjson", "csv"):
+        return jsonify({"error": "format は ndjson または csv を指定してください"}), 400
+    try:
+        date_from, _ = _parse_date_arg("from")
+        date_to, to_is_date = _parse_date_arg("to")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    use_gzip = request.args.get("gzip") == "1"
+
+    stmt = db.select(Log.id, Log.role, Log.timestamp, Log.message).where(
+        Log.user_id == user_id,
+        *logstore.range_conditions(date_from, date_to, to_is_date),
+    )
+    stmt = stmt.order_by(Log.timestamp, Log.id).execution_options(yield_per=EXPORT_BATCH_SIZE)
+
+    def encode_rows(rows):
+        if fmt == "csv":
+            buf = io.StringIO()
+            writer = csv.writer(buf)
+            for r in rows:
+                writer.writerow([r.id, r.role, r.timestamp.isoformat() if r.timestamp else "", r.message])
+            return buf.getvalue()
+        return "".join(
+            json.dumps({
+                "id": r.id,
+                "role": r.role,
+                "timestamp": r.timestamp.isoformat() if r.timestamp else None,
+                "message": r.message,
+            }, ensure_ascii=False) + "\n"
+            for r in rows
+        )
+
+    def generate():
+        compressor = zlib.compressobj(wbits=31) if use_gzip else None  # wbits=31: gzip 形式
+
+        def emit(text: str):
+            data = text.encode("utf-8")
+            return compressor.compress(data) if compressor else data
+
+        if fmt == "csv":
+            yield emit("id,role,timestamp,message\r\n")
+        result = db.session.execute(stmt)
+        for rows in result.partitions():
+            chunk = emit(encode_rows(rows))
+            if chunk:
+                yield chunk
+        if compressor:
+            yield compressor.flush()
+
+    ext = "ndjson" if fmt == "ndjson" else "csv"
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "text/csv"
+    filename = f"logs.{ext}.gz" if use_gzip else f"logs.{ext}"
+    headers = {"Content-Disposition": f"attachment; filename={filename}"}
+    if use_gzip:
+        mimetype = "application/gzip"
+    return Response(stream_with_context(generate()), mimetype=mimetype, headers=headers)
+
 @app.route("/api/logs/<int:log_id>", methods=["DELETE"])
 @jwt_required()
 def api_delete_log(log_id: int):
-    identity = get_jwt_identity()
-    user_id = identity["id"]
+    user_id = int(get_jwt_identity())
 
     log = Log.query.get_or_404(log_id)
     if log.user_id != user_id:
         return jsonify({"error": "権限がありません"}), 403
 
+    day = log.timestamp.date()
     db.session.delete(log)
     db.session.commit()
+    logstore.refresh_days(db.session, user_id, [day])
     return jsonify({"message": "deleted"})
 
+@app.route("/api/logs/search", methods=["GET"])
+@jwt_required()
+def api_search_logs():
+    """?q= を含むログを関連度順に返す（空白区切りはAND）。?page=, ?per_page=（最大100）"""
+    user_id = int(get_jwt_identity())
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "q を指定してください"}), 400
+    page = request.args.get("page", 1, type=int)
+    per_page = request.args.get("per_page", 20, type=int)
+
+    rows, has_next = logsearch.search(db.session, user_id, q, page=page, per_page=per_page)
+    return jsonify({
+        "query": q,
+        "page": page,
+        "has_next": has_next,
+        "results": [
+            {
+                "id": r.id,
+                "role": r.role,
+                "timestamp": r.timestamp.isoformat() if r.timestamp else None,
+                "snippet": r.snippet,
+            } for r in rows
+        ],
+    })
+
+@app.route("/api/logs/days", methods=["GET"])
+@jwt_required()
+def api_log_days():
+    """ログがある日の一覧（件数・モード・最初/最後の時刻）。集計テーブルだけを読む"""
+    user_id = int(get_jwt_identity())
+    # 集計テーブル導入前のログがあれば、その分の集計を一度だけ作る
+    logstore.backfill_activity(db.session, user_id)
+    days = (
+        DailyActivity.query.filter_by(user_id=user_id)
+        .order_by(DailyActivity.day.desc())
+        .all()
+    )
+    return jsonify([
+        {
+            "date": d.day.isoformat(),
+            "count": d.count,
+            "modes": [m for m in d.modes.split(",") if m],
+            "first_at": d.first_at.isoformat() if d.first_at else None,
+            "last_at": d.last_at.isoformat() if d.last_at else None,
+        } for d in days
+    ])
+
+@app.route("/api/logs/bulk_delete", methods=["POST"])
+@jwt_required()
+def api_bulk_delete_logs():
+    """
+    ログの一括削除。次のいずれかを JSON で指定する。
+      {"ids": [1, 2, 3]} / {"from": "2025-01-01", "to": "2025-01-31"} / {"before": "2025-01-01"}
+    """
+    user_id = int(get_jwt_identity())
+    data = request.get_json(silent=True) or {}
+
+    ids = data.get("ids")
+    if ids is not None:
+        if not isinstance(ids, list) or not all(isinstance(i, int) for i in ids):
+            return jsonify({"error": "ids は整数の配列で指定してください"}), 400
+        deleted = logstore.bulk_delete(db.session, user_id, ids=ids)
+        return jsonify({"message": "deleted", "deleted": deleted})
+
+    try:
+        date_from, _ = _parse_date_arg("from", data)
+        date_to, to_is_date = _parse_date_arg("to", data)
+        before, _ = _parse_date_arg("before", data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    conditions = logstore.range_conditions(date_from, date_to, to_is_date, before)
+    if not conditions:
+        return jsonify({"error": "ids, from/to, before のいずれかを指定してください"}), 400
+
+    deleted = logstore.bulk_delete(db.session, user_id, conditions=conditions)
+    return jsonify({"message": "deleted", "deleted": deleted})
+
 # ================================
 # エラーハンドラ（JSON専用）
 # ================================
@@ -501,6 +552,10 @@ def not_found(_):
 def method_not_allowed(_):
     return jsonify({"error": "Method Not Allowed"}), 405
 
+@app.errorhandler(passwords.PasswordHashBusy)
+def password_hash_busy(e):
+    return jsonify({"error": "混み合っています。少し待ってから再度お試しください"}), 503, {"Retry-After": "1"}
+
 @app.errorhandler(500)
 def internal_error(e):
     return jsonify({"error": f"Internal Server Error: {e}"}), 500
@@ -509,5 +564,8 @@ def internal_error(e):
 # エントリポイント
 # ================================
 if __name__ == "__main__":
+    # 開発サーバーではテーブルが無ければ作る（本番は flask init-db）
+    with app.app_context():
+        init_db()
     print("🌟 Flask JSON API サーバー起動中… http://0.0.0.0:5000/(Android: http://10.0.2.2:5000/)")
     app.run(host="0.0.0.0", port=5000, debug=True)
\ No newline at end of file
@@ -116,7 +116,7 @@ document.addEventListener('DOMContentLoaded', () => {
                                 card.className = 'bg-slate-600 text-white dark:bg-gray-100 dark:text-gray-900 rounded p-4 shadow';
                                 card.innerHTML = `
                                     <h3 class="text-xl font-bold mb-2">${movie.title || 'タイトル不明'}</h3>
-                                    ${movie.poster_path ? `<img src="${movie.poster_path}" alt="${movie.title}" class="w-32 mb-2 rounded">` : ''}
+                                    ${movie.poster_path ? `<img src="${movie.poster_path}"${movie.poster_thumb ? ` srcset="${movie.poster_thumb} 154w, ${movie.poster_path} 300w" sizes="128px"` : ''} alt="${movie.title}" loading="lazy" class="w-32 mb-2 rounded">` : ''}
                                     <p class="mb-2 text-sm">${movie.overview || 'あらすじはありません。'}</p>
                                     <p class="text-sm text-slate-300 dark:text-gray-600">公開日: ${movie.release_date || '不明'}</p>
                                     <a href="${movie.tmdb_url}" target="_blank" class="text-blue-400 hover:underline text-sm">TMDBで見る</a>
@@ -156,6 +156,27 @@ document.addEventListener('DOMContentLoaded', () => {
         button.addEventListener('click', () => toggleLogs(date));
     });
 
+    // ===== ログの一括選択・削除 =====
+    const bulkDeleteButton = document.getElementById('bulkDeleteButton');
+    const bulkSelectedCount = document.getElementById('bulkSelectedCount');
+    const updateBulkSelection = () => {
+        const count = document.querySelectorAll('input[name="log_ids"]:checked').length;
+        if (bulkSelectedCount) bulkSelectedCount.textContent = count;
+        if (bulkDeleteButton) bulkDeleteButton.disabled = count === 0;
+    };
+    document.addEventListener('change', (event) => {
+        const target = event.target;
+        if (target.matches('[data-log-select-day]')) {
+            const day = target.getAttribute('data-log-select-day');
+            document.querySelectorAll(`[data-log-select="${day}"]`).forEach(box => {
+                box.checked = target.checked;
+            });
+        }
+        if (target.matches('[data-log-select-day], input[name="log_ids"]')) {
+            updateBulkSelection();
+        }
+    });
+
     // ===== flatpickr の初期化 =====
     if (datePicker) {
         flatpickr(datePicker, {
@@ -191,12 +212,48 @@ document.addEventListener('DOMContentLoaded', () => {
     }
 });
 
+// ===== 天気（ページ表示後に読み込む） =====
+// サーバーは取得済みの天気だけで描画するので、無い・古いときはここで /weather から更新する
+function loadWeather() {
+    const box = document.getElementById('weatherInfo');
+    if (!box || !box.dataset.weatherUrl || box.dataset.weatherFresh === '1') return;
+    fetch(box.dataset.weatherUrl, { headers: { 'Accept': 'application/json' } })
+        .then(response => (response.ok ? response.json() : null))
+        .then(data => {
+            if (!data || !data.weather || data.temp === null) return;
+            const p = document.createElement('p');
+            p.textContent = `${data.city} の現在の天気: ${data.weather} / ${data.temp}℃`;
+            box.replaceChildren(p);
+        })
+        .catch(error => console.error('天気の取得に失敗しました:', error));
+}
+document.addEventListener('DOMContentLoaded', loadWeather);
+
 // ===== グローバル関数（onclick対応） =====
 function toggleLogs(date) {
     const safeDate = date.replace(/-/g, '_');
     const el = document.getElementById('logs-' + safeDate);
     if (!el) return;
     el.classList.toggle('hidden');
+
+    // その日のログは初めて開いたときに読み込む
+    const day = el.getAttribute('data-log-day');
+    if (day && !el.dataset.loaded && !el.classList.contains('hidden')) {
+        el.dataset.loaded = 'loading';
+        fetch(`/logs/day/${day}`)
+            .then(response => {
+                if (!response.ok) throw new Error(`HTTPエラー: ${response.status}`);
+                return response.text();
+            })
+            .then(html => {
+                el.innerHTML = html;
+                el.dataset.loaded = 'done';
+            })
+            .catch(error => {
+                delete el.dataset.loaded;
+                el.innerHTML = `<p class='text-red-500'>ログの読み込みに失敗しました: ${error.message || error}</p>`;
+            });
+    }
 }
 window.toggleLogs = toggleLogs;
 
@@ -0,0 +1,36 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# アプリの import 前に、DB・governor を一時ディレクトリに向ける
+_tmpdir = tempfile.mkdtemp(prefix="i_love_reco_test_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_tmpdir, 'test.db')}")
+os.environ.setdefault("GOVERNOR_DB_PATH", os.path.join(_tmpdir, "governor.db"))
+os.environ.setdefault("POSTER_CACHE_DIR", os.path.join(_tmpdir, "posters"))
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def server_app():
+    import server
+    from core.models import init_db
+
+    with server.app.app_context():
+        init_db()
+    return server.app
+
+
+@pytest.fixture
+def client(server_app):
+    return server_app.test_client()
+
+
+@pytest.fixture(scope="session")
+def auth_headers(server_app):
+    client = server_app.test_client()
+    client.post("/api/register", json={"username": "test", "email": "test@example.com", "password": "pw"})
+    token = client.post("/api/login", json={"email": "test@example.com", "password": "pw"}).get_json()["token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,22 @@
+import pytest
+
+
+@pytest.mark.parametrize("payload", [
+    {"moods": "眠い", "mode": "normal"},
+    {"mood": "眠い", "modes": "playlist"},
+    {"moods": ["眠い", 1]},
+])
+def test_batch_rejects_non_list_moods_and_modes(client, auth_headers, payload):
+    res = client.post("/api/ai/batch", json=payload, headers=auth_headers)
+    assert res.status_code == 400
+
+
+def test_batch_returns_one_result_per_mode(client, auth_headers, monkeypatch):
+    from core import recommend
+
+    monkeypatch.setattr(recommend, "generate_text", lambda prompt, **kwargs: "🍽️ 親子丼 - 温まる")
+    res = client.post("/api/ai/batch", json={"mood": "眠い", "modes": ["playlist", "food"], "pool": False},
+                      headers=auth_headers)
+    assert res.status_code == 200
+    results = res.get_json()["results"]
+    assert [(r["mood"], r["mode"]) for r in results] == [("眠い", "playlist"), ("眠い", "food")]
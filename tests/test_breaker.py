@@ -0,0 +1,76 @@
+import sqlite3
+
+import pytest
+import requests
+
+from core import breaker, governor, upstream
+
+NAME = "tmdb"
+
+
+@pytest.fixture
+def half_open(monkeypatch):
+    """NAME のブレーカーを open にし、次の呼び出しが half_open の試行になる状態にする"""
+    monkeypatch.setenv("UPSTREAM_MODE", "live")
+    breaker._breakers.pop(NAME, None)
+    for _ in range(breaker.MIN_CALLS):
+        breaker.record(NAME, False, 0.0)
+    assert breaker.snapshot()[NAME]["state"] == breaker.OPEN
+    monkeypatch.setattr(breaker, "OPEN_SECONDS", 0)
+    yield
+    breaker._breakers.pop(NAME, None)
+
+
+def _ok_response(*args, **kwargs):
+    res = requests.Response()
+    res.status_code = 200
+    res._content = b"{}"
+    return res
+
+
+def _probe_succeeds(monkeypatch):
+    monkeypatch.setattr(governor, "acquire", lambda *args, **kwargs: True)
+    monkeypatch.setattr(upstream.requests, "request", _ok_response)
+    upstream.get(NAME, "/3/search/movie")
+    assert breaker.snapshot()[NAME]["state"] == breaker.CLOSED
+
+
+def test_probe_is_released_when_governor_raises(half_open, monkeypatch):
+    def locked(*args, **kwargs):
+        raise sqlite3.OperationalError("database is locked")
+
+    monkeypatch.setattr(governor, "acquire", locked)
+    with pytest.raises(sqlite3.OperationalError):
+        upstream.get(NAME, "/3/search/movie")
+    assert not breaker.is_open(NAME)
+    _probe_succeeds(monkeypatch)
+
+
+def test_probe_is_released_on_non_requests_error(half_open, monkeypatch):
+    def broken(*args, **kwargs):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(governor, "acquire", lambda *args, **kwargs: True)
+    monkeypatch.setattr(upstream.requests, "request", broken)
+    with pytest.raises(RuntimeError):
+        upstream.get(NAME, "/3/search/movie")
+    assert not breaker.is_open(NAME)
+    _probe_succeeds(monkeypatch)
+
+
+def test_probe_is_released_when_quota_is_exceeded(half_open, monkeypatch):
+    monkeypatch.setattr(governor, "acquire", lambda *args, **kwargs: False)
+    with pytest.raises(upstream.QuotaExceeded):
+        upstream.get(NAME, "/3/search/movie")
+    _probe_succeeds(monkeypatch)
+
+
+def test_failed_probe_reopens(half_open, monkeypatch):
+    def down(*args, **kwargs):
+        raise requests.exceptions.ConnectionError("down")
+
+    monkeypatch.setattr(governor, "acquire", lambda *args, **kwargs: True)
+    monkeypatch.setattr(upstream.requests, "request", down)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        upstream.get(NAME, "/3/search/movie")
+    assert breaker.snapshot()[NAME]["state"] == breaker.OPEN
@@ -0,0 +1,15 @@
+from core import config, recommend
+from core.models import PoolEntry
+
+
+def test_build_pools_without_youtube_key_keeps_entries(server_app, monkeypatch):
+    monkeypatch.setattr(config, "YOUTUBE_API_KEY", "")
+    monkeypatch.setattr(recommend, "generate_text", lambda prompt, **kwargs: "🎵 Pretender - 前向きになれる")
+    monkeypatch.setattr(recommend, "get_weather", lambda city: (None, None))
+
+    with server_app.app_context():
+        result = server_app.test_cli_runner().invoke(args=["build-pools", "--per-key", "1", "--mode", "playlist",
+                                                           "--mbti", "INFP"])
+        assert "YOUTUBE_API_KEY が未設定" in result.output
+        assert "スキップ" not in result.output
+        assert PoolEntry.query.count() > 0
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy.orm import Session
+
+from core import logstore
+from core.models import DailyActivity, Log, User, db, insert_log
+
+
+def _user(name):
+    user = User(username=name, email=f"{name}@example.com", password_hash="-")
+    db.session.add(user)
+    db.session.commit()
+    return user.id
+
+
+def test_concurrent_workers_do_not_lose_counts(server_app):
+    with server_app.app_context():
+        user_id = _user("concurrent")
+        now = datetime.utcnow()
+        insert_log(user_id, "first", "user", "normal")
+
+        # 別ワーカーが同じ日の集計行を読み込んだ後に、こちらのワーカーが1件記録する
+        with Session(db.engine) as other:
+            stale = other.get(DailyActivity, (user_id, now.date()))
+            assert stale.count == 1
+            insert_log(user_id, "second", "user", "normal")
+            logstore.record_activity(other, user_id, now, "movie")
+            other.commit()
+
+        db.session.expire_all()
+        row = db.session.get(DailyActivity, (user_id, now.date()))
+        assert row.count == 3
+        assert row.modes == "normal,movie"
+
+
+def test_record_activity_merges_modes_and_times(server_app):
+    with server_app.app_context():
+        user_id = _user("modes")
+        noon = datetime(2025, 1, 1, 12)
+        for ts, mode in ((noon, "movie"), (noon - timedelta(hours=2), "food"), (noon + timedelta(hours=1), "movie")):
+            logstore.record_activity(db.session, user_id, ts, mode)
+        db.session.commit()
+        row = db.session.get(DailyActivity, (user_id, noon.date()))
+        assert row.count == 3
+        assert row.modes == "movie,food"
+        assert row.first_at == noon - timedelta(hours=2)
+        assert row.last_at == noon + timedelta(hours=1)
+
+
+def test_old_days_are_backfilled_after_a_new_log(server_app, client):
+    with server_app.app_context():
+        user_id = _user("backfill")
+        # 集計テーブル導入前のログ（集計行なし）
+        old = datetime.utcnow() - timedelta(days=30)
+        db.session.add_all(Log(user_id=user_id, message=f"old {i}", role="user", timestamp=old + timedelta(days=i))
+                           for i in range(3))
+        db.session.commit()
+        # 導入後に1件記録された
+        insert_log(user_id, "new", "user", "food")
+
+        from flask_jwt_extended import create_access_token
+        token = create_access_token(identity=str(user_id))
+
+    res = client.get("/api/logs/days", headers={"Authorization": f"Bearer {token}"})
+    days = res.get_json()
+    assert len(days) == 4
+    assert sum(d["count"] for d in days) == 4
+    assert days[0]["modes"] == ["food"]
@@ -0,0 +1,62 @@
+import pytest
+
+from core import moods
+
+
+@pytest.mark.parametrize("text, key", [
+    ("かなしい", "sad"),
+    ("ちょっと悲しい…", "sad"),
+    ("とても切ない", "sad"),
+    ("すごく眠い", "sleepy"),
+    ("超眠い", "sleepy"),
+    ("今日はのんびりしたい", "relax"),
+    ("疲れた〜", "tired"),
+])
+def test_known_moods(text, key):
+    assert moods.canonicalize(text).key == key
+
+
+@pytest.mark.parametrize("text", [
+    "悲しくない",
+    "嬉しくない",
+    "疲れてない",
+    "やる気がない",
+    "元気がない",
+    "元気が出ない",
+    "眠くない",
+    "眠れず",
+])
+def test_negation_is_not_matched(text):
+    mood = moods.canonicalize(text)
+    assert not moods.is_known(mood)
+    assert mood.key.startswith("raw:")
+
+
+@pytest.mark.parametrize("text", [
+    "好きな人に振られて悲しい",
+    "超えたい",
+])
+def test_compound_input_is_not_misclassified(text):
+    assert not moods.is_known(moods.canonicalize(text))
+
+
+def test_modifiers_are_stripped_only_at_the_start():
+    assert moods.normalize("ちょっと悲しい") == "悲しい"
+    assert moods.normalize("超えたい") == "超えたい"
+    assert moods.normalize("悲しいなんか") == "悲しいなんか"
+
+
+def test_prompt_uses_the_original_words(client, auth_headers, monkeypatch):
+    from core import recommend
+
+    prompts = []
+
+    def fake_generate(prompt, mode, **kwargs):
+        prompts.append(prompt)
+        return {"raw_text": "", "reply": "", "songs": [], "foods": [], "movies": []}
+
+    monkeypatch.setattr(recommend, "generate_recommendation", fake_generate)
+    res = client.post("/api/ai", json={"mood": "好きな人に振られて悲しい", "mode": "normal", "pool": False},
+                      headers=auth_headers)
+    assert res.status_code == 200
+    assert "「好きな人に振られて悲しい」" in prompts[0]
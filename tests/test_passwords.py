@@ -0,0 +1,27 @@
+import threading
+
+from werkzeug.security import generate_password_hash
+
+from core import passwords
+from core.models import User
+
+
+def test_password_hash_column_fits_scrypt():
+    length = User.__table__.c.password_hash.type.length
+    assert len(generate_password_hash("pw", "scrypt:32768:8:1")) <= length
+    assert len(generate_password_hash("pw", "pbkdf2:sha256:600000")) <= length
+
+
+def test_needs_rehash_hashes_off_the_request_thread(monkeypatch):
+    threads = []
+
+    def spy(password, method):
+        threads.append(threading.current_thread())
+        return generate_password_hash(password, method)
+
+    monkeypatch.setattr(passwords, "_method_prefix", None)
+    monkeypatch.setattr(passwords, "generate_password_hash", spy)
+    current = generate_password_hash("pw", passwords.HASH_METHOD)
+    assert not passwords.needs_rehash(current)
+    assert passwords.needs_rehash(generate_password_hash("pw", "scrypt:16384:8:1"))
+    assert threads and threading.current_thread() not in threads
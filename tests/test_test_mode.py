@@ -0,0 +1,50 @@
+import pytest
+import requests
+
+from core import config, recommend, upstream
+
+
+@pytest.fixture
+def offline(monkeypatch, tmp_path):
+    """APIキー無し・フィクスチャ無し・通信すると失敗する状態"""
+    for name in ("GEMINI_API_KEY", "OPENWEATHER_API_KEY", "YOUTUBE_API_KEY", "TMDB_API_KEY"):
+        monkeypatch.setattr(config, name, "")
+    monkeypatch.setenv("UPSTREAM_FIXTURE_DIR", str(tmp_path))
+
+    def no_network(*args, **kwargs):
+        raise AssertionError("テストモードで通信した")
+
+    monkeypatch.setattr(requests, "request", no_network)
+    monkeypatch.setattr(upstream.requests, "request", no_network)
+
+
+def test_test_mode_works_without_network_or_keys(client, auth_headers, offline):
+    res = client.post("/api/ai", json={"mood": "悲しい", "mode": "food", "test": True}, headers=auth_headers)
+    assert res.status_code == 200
+    assert res.get_json()["reply"] == recommend.test_result()["reply"]
+
+    logs = client.get("/api/logs", headers=auth_headers).get_json()
+    assert not any("エラー" in str(log) for log in logs)
+
+
+def test_batch_test_mode_works_without_network_or_keys(client, auth_headers, offline):
+    res = client.post("/api/ai/batch", json={"mood": "悲しい", "modes": ["food", "movie"], "test": True},
+                      headers=auth_headers)
+    assert res.status_code == 200
+    assert all("error" not in r for r in res.get_json()["results"])
+
+
+def test_fixture_key_ignores_weather(monkeypatch):
+    keys = []
+
+    def fake_post(name, path, fixture_json=None, **kwargs):
+        keys.append(upstream.fixture_key(name, "POST", path, kwargs.get("params"), fixture_json))
+        raise upstream.FixtureNotFound(name)
+
+    monkeypatch.setattr(config, "GEMINI_API_KEY", "key")
+    monkeypatch.setattr(config, "GEMINI_MODEL_NAME", "gemini-test")
+    monkeypatch.setattr(upstream, "post", fake_post)
+    for weather, temp in (("晴れ", 20.5), ("小雨", -1.0), (None, None)):
+        with pytest.raises(upstream.FixtureNotFound):
+            recommend.generate_text(recommend.build_prompt("INFP", weather, temp, "眠い", "normal"))
+    assert len(set(keys)) == 1
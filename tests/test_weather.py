@@ -0,0 +1,19 @@
+import time
+
+from core import config, recommend
+
+
+def test_weather_older_than_stale_ttl_is_not_used(monkeypatch):
+    monkeypatch.setattr(config, "OPENWEATHER_API_KEY", "key")
+    monkeypatch.setattr(recommend, "_fetch_weather", lambda city: None)
+    old = time.time() - config.WEATHER_STALE_TTL - 1
+    monkeypatch.setitem(recommend._weather_cache, "Sapporo", (old, ("雪", -3.0)))
+    assert recommend.get_weather("Sapporo") == (None, None)
+
+
+def test_stale_weather_is_returned_while_refreshing(monkeypatch):
+    monkeypatch.setattr(config, "OPENWEATHER_API_KEY", "key")
+    monkeypatch.setattr(recommend, "_fetch_weather", lambda city: None)
+    stale = time.time() - config.WEATHER_CACHE_TTL - 1
+    monkeypatch.setitem(recommend._weather_cache, "Naha", (stale, ("晴れ", 28.0)))
+    assert recommend.get_weather("Naha") == ("晴れ", 28.0)